@@ -0,0 +1,271 @@
+"""
+Materialized dashboard activity feed.
+
+Every event an author sees in their feed is written as an ``activities``
+row owned by that author, in the same transaction as the event itself:
+
+* their own posts, as drafts or published, and drafts being published
+* comments, likes and shares on their posts
+* new newsletter subscribers, fanned out to every author with a published
+  post by one ``INSERT ... SELECT``
+
+A feed page is then one range scan of ``(owner_id, created_at, id)`` with
+primary-key joins to the post, comment, actor and subscriber it mentions,
+however deep the page is. Pages continue from the ``X-Next-Cursor`` token
+like the other lists. Each owner keeps at most
+``ACTIVITY_RETENTION_PER_OWNER`` rows. Writes do not prune; ``prune``
+drops the rows beyond the cap from every feed, on a background job every
+``ACTIVITY_PRUNE_INTERVAL_SECONDS`` or from cron.
+
+Usage:
+    python -m app.activity_feed backfill   # rebuild every feed from existing rows
+    python -m app.activity_feed prune      # apply the retention cap to every feed
+"""
+import os
+import sys
+from typing import Dict, List, Optional
+
+from fastapi import Response
+from sqlalchemy import case, delete, func, insert, literal, select
+from sqlalchemy.orm import Session, aliased
+
+try:
+    from . import models
+    from .database import engine
+    from .jobs import PeriodicJob
+    from .pagination import page_rows, paginate
+except ImportError:
+    import models
+    from database import engine
+    from jobs import PeriodicJob
+    from pagination import page_rows, paginate
+
+ACTIVITY_RETENTION_PER_OWNER = int(os.getenv("ACTIVITY_RETENTION_PER_OWNER", "1000"))
+# How often the in-process job applies the cap; 0 leaves scheduling to cron
+ACTIVITY_PRUNE_INTERVAL_SECONDS = int(os.getenv("ACTIVITY_PRUNE_INTERVAL_SECONDS", "600"))
+
+POST_CREATED = "post_created"
+DRAFT_CREATED = "draft_created"
+POST_PUBLISHED = "post_published"
+COMMENT_RECEIVED = "comment_received"
+LIKE_RECEIVED = "like_received"
+SHARE_RECEIVED = "share_received"
+SUBSCRIBER_JOINED = "subscriber_joined"
+
+Activity = models.Activity
+
+
+def record(
+    db: Session,
+    owner_id: int,
+    activity_type: str,
+    actor_id: Optional[int] = None,
+    post: Optional[models.Post] = None,
+    post_id: Optional[int] = None,
+    comment: Optional[models.Comment] = None,
+    detail: Optional[str] = None,
+) -> None:
+    """Add an event to ``owner_id``'s feed inside the caller's transaction.
+
+    ``post`` and ``comment`` may be pending objects; their ids are filled in
+    when the session flushes.
+    """
+    activity = Activity(owner_id=owner_id, type=activity_type, actor_id=actor_id, post_id=post_id, detail=detail)
+    if post is not None:
+        activity.post = post
+    if comment is not None:
+        activity.comment = comment
+        activity.post_id = comment.post_id
+    db.add(activity)
+
+
+def record_subscriber(db: Session, subscriber_id: int) -> None:
+    """Fan a new subscriber out to the feed of every author with a published post"""
+    authors = select(
+        models.Post.author_id, literal(SUBSCRIBER_JOINED), literal(subscriber_id)
+    ).where(
+        models.Post.is_published == True,
+        models.Post.author_id.is_not(None),
+    ).distinct()
+    db.execute(
+        insert(Activity).from_select(["owner_id", "type", "subscriber_id"], authors)
+    )
+
+
+def forget(db: Session, **criteria) -> None:
+    """Delete the feed events matching column values, e.g. ``post_id=3``"""
+    db.execute(
+        delete(Activity).filter_by(**criteria).execution_options(synchronize_session=False)
+    )
+
+
+def prune(connection) -> int:
+    """Apply the retention cap to every feed; returns how many events were dropped"""
+    ranked = select(
+        Activity.id,
+        func.row_number().over(
+            partition_by=Activity.owner_id,
+            order_by=(Activity.created_at.desc(), Activity.id.desc()),
+        ).label("position"),
+    ).subquery()
+    beyond_cap = select(ranked.c.id).where(ranked.c.position > ACTIVITY_RETENTION_PER_OWNER)
+    return connection.execute(delete(Activity).where(Activity.id.in_(beyond_cap))).rowcount
+
+
+def _run_scheduled() -> None:
+    with engine.begin() as connection:
+        prune(connection)
+
+
+scheduler = PeriodicJob("activity-prune", ACTIVITY_PRUNE_INTERVAL_SECONDS, _run_scheduled)
+
+
+def _item(row) -> Dict:
+    """A feed row in the shape the dashboard has always returned"""
+    post_data = {"post_id": row.post_id, "post_title": row.post_title, "post_slug": row.post_slug}
+    if row.type in (POST_CREATED, DRAFT_CREATED, POST_PUBLISHED):
+        title = f"{'Created draft' if row.type == DRAFT_CREATED else 'Published'}: {row.post_title}"
+        description = row.post_summary or (row.post_excerpt or "") + "..."
+        data = post_data
+    elif row.type == COMMENT_RECEIVED:
+        title = f"New comment on: {row.post_title}"
+        description = f"{row.actor}: {row.comment_excerpt or ''}..."
+        data = {
+            "comment_id": row.comment_id,
+            "post_id": row.post_id,
+            "post_title": row.post_title,
+            "commenter": row.actor,
+        }
+    elif row.type == LIKE_RECEIVED:
+        title = f"New like on: {row.post_title}"
+        description = f"{row.actor} liked your post"
+        data = {**post_data, "liked_by": row.actor}
+    elif row.type == SHARE_RECEIVED:
+        title = f"Shared on {row.detail or 'the web'}: {row.post_title}"
+        description = f"{row.actor} shared your post" if row.actor else "Someone shared your post"
+        data = {**post_data, "platform": row.detail, "shared_by": row.actor}
+    else:
+        name = row.subscriber_name or row.subscriber_email or "Someone"
+        title = "New subscriber"
+        description = f"{name} subscribed to the newsletter"
+        data = {"subscriber_id": row.subscriber_id, "subscriber_email": row.subscriber_email}
+    return {
+        "id": f"activity_{row.id}",
+        "type": row.type,
+        "title": title,
+        "description": description,
+        "timestamp": row.created_at.isoformat(),
+        "data": data,
+    }
+
+
+def feed_page(
+    db: Session,
+    owner_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+) -> List[Dict]:
+    """One page of an owner's feed, newest first, setting the next cursor header"""
+    Post, Comment, Subscriber = models.Post, models.Comment, models.Subscriber
+    Actor = aliased(models.User)
+    statement = (
+        select(
+            Activity.id,
+            Activity.type,
+            Activity.created_at,
+            Activity.post_id,
+            Activity.comment_id,
+            Activity.subscriber_id,
+            Activity.detail,
+            Post.title.label("post_title"),
+            Post.slug.label("post_slug"),
+            Post.summary.label("post_summary"),
+            func.substr(Post.content, 1, 100).label("post_excerpt"),
+            func.substr(Comment.content, 1, 100).label("comment_excerpt"),
+            Actor.username.label("actor"),
+            Subscriber.email.label("subscriber_email"),
+            Subscriber.full_name.label("subscriber_name"),
+        )
+        .outerjoin(Post, Post.id == Activity.post_id)
+        .outerjoin(Comment, Comment.id == Activity.comment_id)
+        .outerjoin(Actor, Actor.id == Activity.actor_id)
+        .outerjoin(Subscriber, Subscriber.id == Activity.subscriber_id)
+        .where(Activity.owner_id == owner_id)
+    )
+
+    dialect_name = db.get_bind().dialect.name
+    statement = paginate(statement, Activity.created_at, Activity.id, dialect_name, cursor, limit=limit)
+    rows = page_rows(db.execute(statement).all(), Activity.created_at, Activity.id, response, limit)
+    return [_item(row) for row in rows]
+
+
+def backfill(bind=engine) -> Dict[str, int]:
+    """Rebuild every feed from the posts, interactions and subscribers already stored"""
+    Post, Comment = models.Post, models.Comment
+    PostLike, PostShare, Subscriber = models.PostLike, models.PostShare, models.Subscriber
+    columns = ["owner_id", "type", "actor_id", "post_id", "comment_id", "subscriber_id", "detail", "created_at"]
+    none = literal(None)
+
+    # Newest subscribers only: older ones would fall outside every cap anyway
+    recent_subscribers = select(Subscriber.id, Subscriber.subscribed_at).where(
+        Subscriber.is_active == True
+    ).order_by(Subscriber.subscribed_at.desc(), Subscriber.id.desc()).limit(
+        ACTIVITY_RETENTION_PER_OWNER
+    ).subquery()
+    authors = select(Post.author_id).where(
+        Post.is_published == True, Post.author_id.is_not(None)
+    ).distinct().subquery()
+
+    sources = {
+        "posts": select(
+            Post.author_id,
+            case((Post.is_published == True, literal(POST_CREATED)), else_=literal(DRAFT_CREATED)),
+            none, Post.id, none, none, none, Post.created_at,
+        ).where(Post.author_id.is_not(None)),
+        "comments": select(
+            Post.author_id, literal(COMMENT_RECEIVED), Comment.author_id, Post.id, Comment.id,
+            none, none, Comment.created_at,
+        ).join(Post, Post.id == Comment.post_id).where(Post.author_id.is_not(None)),
+        "likes": select(
+            Post.author_id, literal(LIKE_RECEIVED), PostLike.user_id, Post.id, none,
+            none, none, PostLike.created_at,
+        ).join(Post, Post.id == PostLike.post_id).where(Post.author_id.is_not(None)),
+        "shares": select(
+            Post.author_id, literal(SHARE_RECEIVED), PostShare.user_id, Post.id, none,
+            none, PostShare.platform, PostShare.shared_at,
+        ).join(Post, Post.id == PostShare.post_id).where(Post.author_id.is_not(None)),
+        "subscribers": select(
+            authors.c.author_id, literal(SUBSCRIBER_JOINED), none, none, none,
+            recent_subscribers.c.id, none, recent_subscribers.c.subscribed_at,
+        ).select_from(authors.join(recent_subscribers, literal(True))),
+    }
+
+    counts = {}
+    with bind.begin() as connection:
+        connection.execute(delete(Activity))
+        for name, source in sources.items():
+            counts[name] = connection.execute(insert(Activity).from_select(columns, source)).rowcount
+        counts["pruned"] = prune(connection)
+    return counts
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["backfill"]:
+        counts = backfill()
+        pruned = counts.pop("pruned")
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        print(f"Rebuilt activity feeds from {summary}; pruned {pruned} beyond the retention cap")
+        return 0
+    if argv[:1] == ["prune"]:
+        with engine.begin() as connection:
+            pruned = prune(connection)
+        print(f"Pruned {pruned} activities beyond {ACTIVITY_RETENTION_PER_OWNER} per owner")
+        return 0
+    print("Usage: python -m app.activity_feed backfill|prune")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+"""
+Aggregation queries shared by the analytics and dashboard endpoints.
+
+Every interaction table (views, likes, comments, shares) is exposed as one
+UNION ALL of ``(metric, post_id, occurred_at)`` rows joined on
+``posts.author_id``, so callers can aggregate all four metrics with a single
+statement instead of one COUNT per metric and period.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Date, case, func, literal, or_, select, union_all
+from sqlalchemy.orm import Session
+
+try:
+    from . import models
+except ImportError:
+    import models
+
+TIME_RANGE_DAYS = {"7d": 7, "30d": 30, "90d": 90, "1y": 365}
+DEFAULT_TIME_RANGE_DAYS = 30
+
+METRICS = ("views", "likes", "comments", "shares")
+
+# Weights for the "engagement" ranking key; deeper interactions count more
+ENGAGEMENT_WEIGHTS = {"views": 1, "likes": 3, "comments": 5, "shares": 4}
+RANKING_KEYS = METRICS + ("engagement",)
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+
+def time_range_days(time_range: str) -> int:
+    """Number of days covered by a ``time_range`` query parameter"""
+    return TIME_RANGE_DAYS.get(time_range, DEFAULT_TIME_RANGE_DAYS)
+
+
+def period_bounds(time_range: str, now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Return ``(start, previous_start)`` for the current and previous period"""
+    days = time_range_days(time_range)
+    start = (now or datetime.utcnow()) - timedelta(days=days)
+    return start, start - timedelta(days=days)
+
+
+def _interaction_sources():
+    return (
+        ("views", models.PostView.post_id, models.PostView.viewed_at),
+        ("likes", models.PostLike.post_id, models.PostLike.created_at),
+        ("comments", models.Comment.post_id, models.Comment.created_at),
+        ("shares", models.PostShare.post_id, models.PostShare.shared_at),
+    )
+
+
+def day_bound(moment: datetime):
+    """Compare ``occurred_at`` against the start of ``moment``'s day.
+
+    Bound as a DATE so it orders correctly against both raw timestamps and
+    the rollup's day values (SQLite compares them as text).
+    """
+    return literal(moment.date(), Date)
+
+
+def interaction_events(
+    author_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    published_only: bool = True,
+    metrics=METRICS,
+    rollup_cutoff: Optional[datetime] = None,
+):
+    """Subquery of ``(metric, post_id, occurred_at, weight)`` rows for an author's posts.
+
+    The date filters are applied inside each branch so every interaction
+    table is searched through its own ``post_id``/timestamp predicates.
+    Raw rows weigh one. With a ``rollup_cutoff`` (see ``rollup.fresh_cutoff``)
+    the days before it are read from ``post_daily_stats`` instead, one row
+    per post and day weighted by its count; those rows carry a date, so
+    ``since`` must then be day aligned and comparisons use ``day_bound``.
+    """
+    def scoped(branch, post_column):
+        branch = branch.join(models.Post, models.Post.id == post_column).where(
+            models.Post.author_id == author_id
+        )
+        if published_only:
+            branch = branch.where(models.Post.is_published == True)
+        return branch
+
+    raw_since = since
+    if rollup_cutoff is not None:
+        raw_since = rollup_cutoff if since is None else max(since, rollup_cutoff)
+
+    branches = []
+    for metric, post_column, time_column in _interaction_sources():
+        if metric not in metrics:
+            continue
+        branch = scoped(select(
+            literal(metric).label("metric"),
+            post_column.label("post_id"),
+            time_column.label("occurred_at"),
+            literal(1).label("weight"),
+        ), post_column)
+        if raw_since is not None:
+            branch = branch.where(time_column >= raw_since)
+        if until is not None:
+            branch = branch.where(time_column < until)
+        branches.append(branch)
+
+        if rollup_cutoff is None:
+            continue
+        stats = models.PostDailyStat
+        count_column = getattr(stats, metric)
+        rolled = scoped(select(
+            literal(metric),
+            stats.post_id,
+            stats.day,
+            count_column,
+        ), stats.post_id).where(
+            stats.day < day_bound(rollup_cutoff),
+            count_column > 0,
+        )
+        if since is not None:
+            rolled = rolled.where(stats.day >= day_bound(since))
+        if until is not None:
+            rolled = rolled.where(stats.day < day_bound(until))
+        branches.append(rolled)
+    return union_all(*branches).subquery("events")
+
+
+def empty_metrics() -> Dict[str, int]:
+    return {metric: 0 for metric in METRICS}
+
+
+def period_totals(
+    db: Session,
+    author_id: int,
+    start: datetime,
+    previous_start: datetime,
+    rollup_cutoff: Optional[datetime] = None,
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Current and previous period counts for every metric in one statement.
+
+    Reading from the rollup aligns both periods to whole days.
+    """
+    if rollup_cutoff is not None:
+        start = truncate_to_bucket(start, "day")
+        previous_start = truncate_to_bucket(previous_start, "day")
+        boundary = day_bound(start)
+    else:
+        boundary = start
+
+    events = interaction_events(author_id, since=previous_start, rollup_cutoff=rollup_cutoff)
+    current = func.sum(case((events.c.occurred_at >= boundary, events.c.weight), else_=0))
+    previous = func.sum(case((events.c.occurred_at < boundary, events.c.weight), else_=0))
+
+    rows = db.execute(
+        select(events.c.metric, current, previous).group_by(events.c.metric)
+    ).all()
+
+    current_totals, previous_totals = empty_metrics(), empty_metrics()
+    for metric, current_count, previous_count in rows:
+        current_totals[metric] = int(current_count or 0)
+        previous_totals[metric] = int(previous_count or 0)
+    return current_totals, previous_totals
+
+
+def all_time_totals(db: Session, author_id: int, published_only: bool = True) -> Dict[str, int]:
+    """All-time counts for every metric, summed from the posts' counters"""
+    columns = {
+        "views": models.Post.view_count,
+        "likes": models.Post.like_count,
+        "comments": models.Post.comment_count,
+        "shares": models.Post.share_count,
+    }
+    stmt = select(*[
+        func.coalesce(func.sum(column), 0).label(metric)
+        for metric, column in columns.items()
+    ]).where(models.Post.author_id == author_id)
+    if published_only:
+        stmt = stmt.where(models.Post.is_published == True)
+
+    row = db.execute(stmt).one()
+    return {metric: int(getattr(row, metric)) for metric in columns}
+
+
+def post_and_subscriber_counts(db: Session, author_id: int) -> Dict[str, int]:
+    """Post counts for an author plus active subscribers in one statement"""
+    active_subscribers = select(func.count(models.Subscriber.id)).where(
+        models.Subscriber.is_active == True
+    ).scalar_subquery()
+
+    total, published, subscribers = db.execute(
+        select(
+            func.count(models.Post.id),
+            func.coalesce(func.sum(case((models.Post.is_published == True, 1), else_=0)), 0),
+            active_subscribers,
+        ).where(models.Post.author_id == author_id)
+    ).one()
+
+    return {
+        "total_posts": int(total),
+        "published_posts": int(published),
+        "draft_posts": int(total) - int(published),
+        "total_subscribers": int(subscribers),
+    }
+
+
+def _metric_sums(events):
+    return [
+        func.sum(case((events.c.metric == metric, events.c.weight), else_=0)).label(metric)
+        for metric in METRICS
+    ]
+
+
+def per_post_counts(events):
+    """Group an events subquery into one row of metric counts per post"""
+    return select(
+        events.c.post_id, *_metric_sums(events)
+    ).group_by(events.c.post_id).subquery("post_counts")
+
+
+def top_posts(
+    db: Session,
+    author_id: int,
+    start: datetime,
+    limit: int = 10,
+    sort_by: str = "views",
+    rollup_cutoff: Optional[datetime] = None,
+):
+    """Rank an author's published posts by interactions since ``start``.
+
+    Counting, ranking and limiting all happen in the database so the cost
+    does not grow with the number of posts returned by the filter.
+    """
+    since = truncate_to_bucket(start, "day") if rollup_cutoff is not None else start
+    counts = per_post_counts(
+        interaction_events(author_id, since=since, rollup_cutoff=rollup_cutoff)
+    )
+    metric_columns = {
+        metric: func.coalesce(getattr(counts.c, metric), 0).label(metric)
+        for metric in METRICS
+    }
+    score = sum(
+        weight * metric_columns[metric] for metric, weight in ENGAGEMENT_WEIGHTS.items()
+    ).label("score")
+    ranking = score if sort_by == "engagement" else metric_columns[sort_by]
+
+    stmt = (
+        select(
+            models.Post.id,
+            models.Post.title,
+            models.Post.slug,
+            models.Post.created_at,
+            *metric_columns.values(),
+            score,
+        )
+        .outerjoin(counts, counts.c.post_id == models.Post.id)
+        .where(
+            models.Post.author_id == author_id,
+            models.Post.is_published == True,
+            models.Post.created_at >= start,
+        )
+        .order_by(ranking.desc(), models.Post.id.desc())
+        .limit(limit)
+    )
+    return db.execute(stmt).all()
+
+
+def truncate_to_bucket(moment: datetime, granularity: str) -> datetime:
+    """Start of the hour/day/week/month containing ``moment`` (weeks start Monday)"""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment + timedelta(hours=1)
+    if granularity == "week":
+        return moment + timedelta(weeks=1)
+    if granularity == "month":
+        if moment.month == 12:
+            return moment.replace(year=moment.year + 1, month=1)
+        return moment.replace(month=moment.month + 1)
+    return moment + timedelta(days=1)
+
+
+def bucket_label(moment: datetime, granularity: str) -> str:
+    """Label for a bucket start; must match what ``bucket_expression`` emits"""
+    if granularity == "hour":
+        return moment.strftime("%Y-%m-%d %H:00")
+    return moment.strftime("%Y-%m-%d")
+
+
+def bucket_expression(column, granularity: str, dialect_name: str):
+    """SQL expression labelling ``column`` with its bucket start"""
+    if dialect_name == "sqlite":
+        if granularity == "hour":
+            return func.strftime("%Y-%m-%d %H:00", column)
+        if granularity == "week":
+            # Next Sunday (or the same day), then back to that week's Monday
+            return func.date(column, "weekday 0", "-6 days")
+        if granularity == "month":
+            return func.strftime("%Y-%m-01", column)
+        return func.date(column)
+
+    truncated = func.date_trunc(granularity, column)
+    if granularity == "hour":
+        return func.to_char(truncated, "YYYY-MM-DD HH24:00")
+    return func.to_char(truncated, "YYYY-MM-DD")
+
+
+def time_series(
+    db: Session,
+    author_id: int,
+    start: datetime,
+    granularity: str = "day",
+    end: Optional[datetime] = None,
+    rollup_cutoff: Optional[datetime] = None,
+):
+    """Per-bucket counts of every metric with empty buckets filled in.
+
+    Buckets are computed with one GROUP BY over the interaction events and
+    the gaps are filled here, so the cost is one statement for any range.
+    The daily rollup cannot serve hourly buckets and is ignored for them.
+    """
+    end = end or datetime.utcnow()
+    first_bucket = truncate_to_bucket(start, granularity)
+    if granularity == "hour":
+        rollup_cutoff = None
+
+    events = interaction_events(author_id, since=first_bucket, rollup_cutoff=rollup_cutoff)
+    bucket = bucket_expression(
+        events.c.occurred_at, granularity, db.get_bind().dialect.name
+    ).label("bucket")
+    rows = db.execute(
+        select(bucket, *_metric_sums(events)).group_by(bucket)
+    ).all()
+    counts = {row.bucket: row for row in rows}
+
+    series = []
+    moment = first_bucket
+    while moment <= end:
+        label = bucket_label(moment, granularity)
+        row = counts.get(label)
+        point = {"date": label}
+        for metric in METRICS:
+            point[metric] = int(getattr(row, metric)) if row else 0
+        series.append(point)
+        moment = next_bucket(moment, granularity)
+    return series
+
+
+def subscriber_growth(db: Session, start: datetime, end: Optional[datetime] = None):
+    """Daily subscriber adds, removals and running totals since ``start``.
+
+    Subscriptions and unsubscriptions are grouped by day in one statement;
+    everything before the first day collapses into a single baseline
+    bucket, and the totals are a running sum over the daily net change.
+    """
+    end = end or datetime.utcnow()
+    first_day = truncate_to_bucket(start, "day")
+    dialect_name = db.get_bind().dialect.name
+
+    subscriber = models.Subscriber
+    # Inactive rows without an unsubscribe date predate churn tracking and
+    # were never counted as active, so they are left out entirely
+    tracked = or_(subscriber.is_active == True, subscriber.unsubscribed_at.isnot(None))
+    events = union_all(
+        select(
+            subscriber.subscribed_at.label("occurred_at"),
+            literal(1).label("added"),
+            literal(0).label("removed"),
+        ).where(tracked, subscriber.subscribed_at.isnot(None)),
+        select(
+            subscriber.unsubscribed_at.label("occurred_at"),
+            literal(0).label("added"),
+            literal(1).label("removed"),
+        ).where(subscriber.unsubscribed_at.isnot(None)),
+    ).subquery("subscriber_events")
+
+    bucket = case(
+        (events.c.occurred_at < first_day, literal("")),
+        else_=bucket_expression(events.c.occurred_at, "day", dialect_name),
+    ).label("bucket")
+    rows = db.execute(
+        select(
+            bucket,
+            func.sum(events.c.added).label("added"),
+            func.sum(events.c.removed).label("removed"),
+        ).group_by(bucket)
+    ).all()
+    changes = {row.bucket: row for row in rows}
+
+    baseline = changes.pop("", None)
+    total = int(baseline.added - baseline.removed) if baseline else 0
+
+    series = []
+    moment = first_day
+    while moment <= end:
+        label = bucket_label(moment, "day")
+        row = changes.get(label)
+        added = int(row.added) if row else 0
+        removed = int(row.removed) if row else 0
+        total += added - removed
+        series.append({
+            "date": label,
+            "subscribers": total,
+            "added": added,
+            "removed": removed,
+            "net": added - removed,
+        })
+        moment = next_bucket(moment, "day")
+    return series
+
+
+def percentage_change(current: int, previous: int) -> float:
+    if previous == 0:
+        return 100.0 if current > 0 else 0.0
+    return ((current - previous) / previous) * 100
@@ -1,18 +1,71 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import asyncio
+import hashlib
 import os
+import statistics
+import sys
+import threading
+import time
 from dotenv import load_dotenv
 
+try:
+    from .cache import TTLCache
+except ImportError:
+    from cache import TTLCache
+
 # Load environment variables
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Verified claims per bearer token, so repeat requests skip jwt.decode
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# bcrypt cost factor; pick one with ``python -m app.auth benchmark``. Hashes
+# made with any other cost are replaced on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt runs on its own small pool so login bursts cannot take over the
+# request threadpool; hashes beyond the queue limit are refused (503)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+class PasswordHashingBusy(Exception):
+    """The password hashing queue is full"""
+
+class PasswordHashingPool:
+    """Bounded executor for bcrypt work with a cap on queued jobs"""
+    
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        # Running plus waiting jobs; released when the job finishes, even if
+        # the request awaiting it was cancelled
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+    
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+hashing_pool = PasswordHashingPool()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -20,6 +73,13 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify on the hashing pool; also returns a new hash if the stored one is outdated"""
+    return await hashing_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await hashing_pool.run(pwd_context.hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -30,12 +90,104 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Keyed by a digest of the token, never the token itself; each entry lives
+# until the token's own expiry
+token_cache = TTLCache(max_entries=TOKEN_CACHE_MAX_ENTRIES, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+_token_keys_by_user = {}
+_token_keys_lock = threading.Lock()
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def _cache_claims(key: bytes, payload: dict) -> None:
+    ttl = payload.get("exp", 0) - time.time()
+    if ttl <= 0:
+        return
+    token_cache.set(key, payload, ttl=ttl)
+    with _token_keys_lock:
+        # Forget keys the cache has already expired or evicted
+        live = {known for known in _token_keys_by_user.get(payload["sub"], ()) if known in token_cache}
+        live.add(key)
+        _token_keys_by_user[payload["sub"]] = live
+
+def revoke_user_tokens(username: str) -> None:
+    """Drop cached claims for every token issued to ``username``"""
+    with _token_keys_lock:
+        keys = _token_keys_by_user.pop(username, set())
+    for key in keys:
+        token_cache.pop(key)
+
+def decode_token(token: str) -> dict:
+    """Verified claims of ``token``; raises JWTError if it is invalid or expired"""
+    key = _token_key(token)
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("sub") is not None:
+            _cache_claims(key, payload)
+    return payload
+
 def verify_token(token: str, credentials_exception):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         return username
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+def benchmark(target_ms: float, min_rounds: int = 8, max_rounds: int = 16, samples: int = 5) -> int:
+    """Median of ``samples`` hashes per cost factor; returns the highest cost within ``target_ms``"""
+    # The first hash pays for backend loading and cold caches; keep it out of the samples
+    pwd_context.hash("benchmark-password", rounds=min_rounds)
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            pwd_context.hash("benchmark-password", rounds=rounds)
+            timings.append((time.perf_counter() - started) * 1000)
+        elapsed_ms = statistics.median(timings)
+        print(f"rounds={rounds:<3} {elapsed_ms:8.1f} ms (median of {samples}, min {min(timings):.1f})")
+        if elapsed_ms > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+def benchmark_tokens(iterations: int = 20000) -> None:
+    """Per-request token verification cost with and without the claims cache"""
+    token = create_access_token({"sub": "benchmark-user"}, timedelta(minutes=5))
+    credentials_exception = Exception("invalid token")
+    
+    def per_call_us(clear_cache: bool) -> float:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            if clear_cache:
+                token_cache.clear()
+            verify_token(token, credentials_exception)
+        return (time.perf_counter() - started) / iterations * 1e6
+    
+    uncached = per_call_us(clear_cache=True)
+    cached = per_call_us(clear_cache=False)
+    revoke_user_tokens("benchmark-user")
+    print(f"verify_token, full jwt.decode: {uncached:8.1f} us/request")
+    print(f"verify_token, cached claims:   {cached:8.1f} us/request ({uncached / cached:.0f}x faster)")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else None
+    if command == "benchmark":
+        target_ms = float(argv[1]) if len(argv) > 1 else 250.0
+        samples = int(argv[2]) if len(argv) > 2 else 5
+        rounds = benchmark(target_ms, samples=samples)
+        print(f"Highest cost within {target_ms:.0f} ms: BCRYPT_ROUNDS={rounds} (current: {BCRYPT_ROUNDS})")
+        return 0
+    if command == "benchmark-tokens":
+        benchmark_tokens(int(argv[1]) if len(argv) > 1 else 20000)
+        return 0
+    print("Usage: python -m app.auth benchmark [target_ms] [samples] | benchmark-tokens [iterations]")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
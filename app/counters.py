@@ -0,0 +1,110 @@
+"""
+Denormalized engagement counters on ``posts``.
+
+The write paths bump ``view_count``, ``like_count``, ``comment_count`` and
+``share_count`` in the same transaction as the interaction row, so per-post
+stats are a primary-key read. ``reconcile`` recounts everything from the
+interaction tables and repairs any drift.
+
+Usage:
+    python -m app.counters reconcile
+"""
+import sys
+from typing import Dict
+
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.orm import Session
+
+try:
+    from . import models
+    from .database import SessionLocal
+except ImportError:
+    import models
+    from database import SessionLocal
+
+COUNTER_COLUMNS = {
+    "views": models.Post.view_count,
+    "likes": models.Post.like_count,
+    "comments": models.Post.comment_count,
+    "shares": models.Post.share_count,
+}
+
+
+def adjust(db: Session, post_id: int, counter: str, amount: int = 1) -> None:
+    """Add ``amount`` to one of a post's counters inside the caller's transaction"""
+    column = COUNTER_COLUMNS[counter]
+    db.query(models.Post).filter(models.Post.id == post_id).update(
+        {
+            column: column + amount,
+            # Counter bumps are not content edits; keep updated_at and version as is
+            models.Post.updated_at: models.Post.updated_at,
+            models.Post.version: models.Post.version,
+        },
+        synchronize_session=False,
+    )
+
+
+def add_views(connection, views_per_post: Dict[int, int]) -> None:
+    """Bump ``view_count`` for many posts with one executemany"""
+    if not views_per_post:
+        return
+    posts = models.Post.__table__
+    connection.execute(
+        update(posts)
+        .where(posts.c.id == bindparam("post_id"))
+        .values(
+            view_count=posts.c.view_count + bindparam("views"),
+            updated_at=posts.c.updated_at,
+            version=posts.c.version,
+        ),
+        [{"post_id": post_id, "views": views} for post_id, views in views_per_post.items()],
+    )
+
+
+def _recount(model, post_column):
+    return (
+        select(func.count())
+        .select_from(model)
+        .where(post_column == models.Post.id)
+        .scalar_subquery()
+    )
+
+
+def reconcile(db: Session) -> int:
+    """Recount every post's counters from the interaction tables.
+
+    Returns the number of posts whose counters had drifted.
+    """
+    recounts = {
+        models.Post.view_count: _recount(models.PostView, models.PostView.post_id),
+        models.Post.like_count: _recount(models.PostLike, models.PostLike.post_id),
+        models.Post.comment_count: _recount(models.Comment, models.Comment.post_id),
+        models.Post.share_count: _recount(models.PostShare, models.PostShare.post_id),
+    }
+    result = db.execute(
+        update(models.Post)
+        .where(or_(*[column != recount for column, recount in recounts.items()]))
+        .values({**recounts, models.Post.updated_at: models.Post.updated_at, models.Post.version: models.Post.version})
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["reconcile"]:
+        print("Usage: python -m app.counters reconcile")
+        return 1
+
+    db = SessionLocal()
+    try:
+        repaired = reconcile(db)
+        print(f"Reconciled engagement counters; repaired {repaired} post(s)")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
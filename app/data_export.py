@@ -0,0 +1,153 @@
+"""
+Streaming account export for ``GET /user/export-data``.
+
+The export is produced while it is sent. Every section is one query whose
+rows arrive in ``yield_per`` batches as plain column tuples, with the post
+title joined in rather than loaded per row, and is encoded and flushed in
+small chunks. Memory use therefore stays flat however many posts, comments,
+likes and views an account has. The generators open their own session,
+since they keep running after the route function has returned.
+
+Two encodings share the same records:
+
+* NDJSON: one JSON object per line, tagged with its ``type``
+* ZIP: one ``<section>.ndjson`` file per section, deflated on the fly
+"""
+import io
+import json
+import zipfile
+from datetime import date, datetime
+from typing import Iterator
+
+from sqlalchemy import select
+
+try:
+    from . import models
+    from .database import SessionLocal
+except ImportError:
+    import models
+    from database import SessionLocal
+
+EXPORT_BATCH_SIZE = 500
+# Encoded output is flushed to the client in chunks of about this size
+CHUNK_BYTES = 64 * 1024
+
+# Section name -> ``type`` of its NDJSON records
+RECORD_TYPES = {
+    "user": "user",
+    "settings": "settings",
+    "posts": "post",
+    "comments": "comment",
+    "likes": "like",
+    "views": "view",
+}
+
+USER_COLUMNS = [
+    "id", "username", "email", "full_name", "bio", "website", "twitter", "linkedin",
+    "created_at", "updated_at",
+]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _encode(record: dict) -> bytes:
+    return json.dumps(record, default=_json_default).encode() + b"\n"
+
+
+def _section_queries(user_id: int) -> dict:
+    """select() per export section, each returning the section's records as rows"""
+    User, Post, Comment = models.User, models.Post, models.Comment
+    PostLike, PostView, UserSettings = models.PostLike, models.PostView, models.UserSettings
+    settings_columns = [
+        column for column in UserSettings.__table__.columns if column.key not in ("id", "user_id")
+    ]
+    return {
+        "user": select(*[getattr(User, name) for name in USER_COLUMNS]).where(User.id == user_id),
+        "settings": select(*settings_columns).where(UserSettings.user_id == user_id),
+        "posts": select(
+            Post.id, Post.title, Post.slug, Post.summary, Post.content, Post.is_published,
+            Post.view_count, Post.like_count, Post.comment_count, Post.share_count,
+            Post.created_at, Post.updated_at,
+        ).where(Post.author_id == user_id).order_by(Post.created_at, Post.id),
+        "comments": select(
+            Comment.id, Comment.post_id, Post.title.label("post_title"), Comment.content,
+            Comment.created_at, Comment.updated_at,
+        ).join(Post, Post.id == Comment.post_id)
+        .where(Comment.author_id == user_id).order_by(Comment.created_at, Comment.id),
+        "likes": select(
+            PostLike.post_id, Post.title.label("post_title"), PostLike.created_at,
+        ).join(Post, Post.id == PostLike.post_id)
+        .where(PostLike.user_id == user_id).order_by(PostLike.created_at, PostLike.id),
+        "views": select(
+            PostView.post_id, Post.title.label("post_title"), PostView.ip_address,
+            PostView.user_agent, PostView.viewed_at,
+        ).join(Post, Post.id == PostView.post_id)
+        .where(PostView.user_id == user_id).order_by(PostView.viewed_at, PostView.id),
+    }
+
+
+def _records(db, statement) -> Iterator[dict]:
+    result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        yield dict(row._mapping)
+
+
+def ndjson_chunks(user_id: int) -> Iterator[bytes]:
+    """The export as NDJSON lines, e.g. ``{"type": "post", "id": 1, ...}``"""
+    db = SessionLocal()
+    try:
+        buffer = bytearray()
+        for section, statement in _section_queries(user_id).items():
+            for record in _records(db, statement):
+                buffer += _encode({"type": RECORD_TYPES[section], **record})
+                if len(buffer) >= CHUNK_BYTES:
+                    yield bytes(buffer)
+                    buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+    finally:
+        db.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def zip_chunks(user_id: int) -> Iterator[bytes]:
+    """The export as a ZIP archive with one NDJSON file per section"""
+    db = SessionLocal()
+    sink = _ChunkSink()
+    try:
+        # An unseekable sink makes zipfile write sizes after each entry
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for section, statement in _section_queries(user_id).items():
+                with archive.open(f"{section}.ndjson", mode="w", force_zip64=True) as entry:
+                    for record in _records(db, statement):
+                        entry.write(_encode(record))
+                        if len(sink) >= CHUNK_BYTES:
+                            yield sink.drain()
+        yield sink.drain()
+    finally:
+        db.close()
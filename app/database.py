@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, raiseload
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
 from dotenv import load_dotenv
 
@@ -10,15 +13,68 @@ load_dotenv()
 # Use SQLite for development (easier setup)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./blog.db")
 
+# Make any relationship lazy load that would emit SQL raise instead, so N+1
+# queries fail loudly in tests and development. Queries must eager load
+# what they serialize (joinedload/selectinload/contains_eager).
+DB_RAISE_ON_LAZY_LOAD = os.getenv("DB_RAISE_ON_LAZY_LOAD", "false").lower() in ("1", "true", "yes")
+
 engine = create_engine(
     DATABASE_URL, 
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 SessionLocal=sessionmaker(autocommit=False,autoflush=False,bind=engine)
 Base=declarative_base()
+
+def _async_url(url: str) -> str:
+    """Same database through its asyncio driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+# Only SQLite and PostgreSQL URLs are translated; anything else must name its
+# asyncio driver, or every import of this module would fail in create_async_engine
+_async_database_url = make_url(ASYNC_DATABASE_URL)
+if not _async_database_url.get_dialect().is_async:
+    raise RuntimeError(
+        f"No asyncio driver in database URL {_async_database_url.render_as_string()!r}; "
+        "set ASYNC_DATABASE_URL to the same database through an async driver, "
+        "e.g. mysql+aiomysql://..."
+    )
+# Connections shared by the async routes; requests beyond this wait in the pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    # aiosqlite defaults to a new connection (and thread) per checkout
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if DB_RAISE_ON_LAZY_LOAD:
+    @event.listens_for(SessionLocal, "do_orm_execute")
+    def _raise_on_lazy_load(execute_state):
+        if (
+            execute_state.is_select
+            and not execute_state.is_column_load
+            and not execute_state.is_relationship_load
+        ):
+            # Explicit loader options on a query take precedence over the wildcard
+            execute_state.statement = execute_state.statement.options(raiseload("*", sql_only=True))
+
 def get_db():
     db=SessionLocal()
     try:
         yield db
     finally:
-        db.close()    
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
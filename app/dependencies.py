@@ -1,28 +1,72 @@
+import os
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 try:
     from . import models, schemas
-    from .database import get_db
+    from .database import get_db, get_async_db
     from .auth import verify_token
+    from .cache import TTLCache
 except ImportError:
     import models, schemas
-    from database import get_db
+    from database import get_db, get_async_db
     from auth import verify_token
+    from cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+# Authenticated users are cached by username for a short time so most
+# requests resolve their principal without a query. Anything that changes
+# a user row must call invalidate_user().
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+user_cache = TTLCache(max_entries=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL_SECONDS)
+
+_USER_COLUMNS = [attr.key for attr in inspect(models.User).column_attrs]
+
+def _cache_user(user: models.User) -> None:
+    # Plain column values, never the instance: sessions must not share objects
+    user_cache.set(user.username, {key: getattr(user, key) for key in _USER_COLUMNS})
+
+def _cached_user(username: str) -> Optional[models.User]:
+    """A detached User rebuilt from the cache, ready to merge into a session"""
+    columns = user_cache.get(username)
+    if columns is None:
+        return None
+    user = models.User(**columns)
+    make_transient_to_detached(user)
+    return user
+
+def invalidate_user(*usernames: str) -> None:
+    for username in usernames:
+        user_cache.pop(username)
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    credentials_exception = _credentials_exception()
     username = verify_token(token, credentials_exception)
+    
+    cached = _cached_user(username)
+    if cached is not None:
+        # Attach to this request's session without a SELECT
+        return db.merge(cached, load=False)
+    
     user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
         raise credentials_exception
+    _cache_user(user)
     return user
 
 def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
@@ -30,6 +74,28 @@ def get_current_active_user(current_user: schemas.User = Depends(get_current_use
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """``get_current_user`` for async routes, without a threadpool hop"""
+    credentials_exception = _credentials_exception()
+    username = verify_token(token, credentials_exception)
+    
+    cached = _cached_user(username)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+    
+    user = (await db.execute(
+        select(models.User).where(models.User.username == username)
+    )).scalars().first()
+    if user is None:
+        raise credentials_exception
+    _cache_user(user)
+    return user
+
+async def get_current_active_user_async(current_user: schemas.User = Depends(get_current_user_async)):
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
 def get_admin_user(current_user: schemas.User = Depends(get_current_active_user)):
     if not current_user.is_admin:
         raise HTTPException(
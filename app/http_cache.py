@@ -0,0 +1,100 @@
+"""
+HTTP conditional GET helpers for the public read endpoints.
+
+A route first selects a fingerprint of what it is about to serve: ids,
+row versions and the small author columns, never the post bodies. The
+strong ETag is a digest of that fingerprint. When the client's
+``If-None-Match`` still matches, the route answers ``304`` from that
+lightweight query alone; otherwise it loads and serializes the full payload
+as before and tags the response. Single posts also carry ``Last-Modified``
+for clients that only send ``If-Modified-Since``; lists do not, since a
+deleted row leaves no timestamp behind.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select
+
+try:
+    from . import models, schemas
+except ImportError:
+    import models, schemas
+
+# 0 keeps clients and CDNs revalidating on every use, which is cheap now
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+
+# Author fields embedded in post and comment responses
+AUTHOR_COLUMNS = [
+    getattr(models.User, name).label(f"author_{name}")
+    for name in [*schemas.User.model_fields, "updated_at"]
+]
+
+
+def fingerprint(model):
+    """select() of the columns that decide a post or comment response, author included"""
+    return select(
+        model.id, model.version, model.created_at, model.updated_at, *AUTHOR_COLUMNS
+    ).join(model.author)
+
+
+def compute_etag(rows: Iterable) -> str:
+    digest = hashlib.sha256(repr([tuple(row) for row in rows]).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def last_modified(row) -> Optional[datetime]:
+    """Latest change to a fingerprint row or its author"""
+    timestamps = (row.created_at, row.updated_at, row.author_updated_at)
+    known = [timestamp for timestamp in timestamps if timestamp is not None]
+    if not known:
+        return None
+    latest = max(timestamp.replace(tzinfo=None) for timestamp in known)
+    # Stored timestamps are UTC; HTTP dates have one-second precision
+    return latest.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
+
+
+def _not_modified_since(header: str, modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified <= since
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    etag: str,
+    modified: Optional[datetime] = None,
+) -> Optional[Response]:
+    """Tag ``response`` with validators; return a 304 if the client's copy is current"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate",
+    }
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = bool(if_modified_since and modified and _not_modified_since(if_modified_since, modified))
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return None
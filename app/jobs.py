@@ -0,0 +1,45 @@
+"""
+In-process periodic background jobs.
+
+A ``PeriodicJob`` calls its function on a daemon thread right away and then
+every ``interval_seconds``; a failed run is logged and retried on the next
+tick. An interval of 0 or less never starts the thread, leaving the work to
+cron or the job's command line.
+"""
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Runs ``fn`` every ``interval_seconds`` on a background thread"""
+
+    def __init__(self, name: str, interval_seconds: float, fn: Callable[[], object]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.fn = fn
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_seconds)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.fn()
+            except Exception:
+                logger.exception("Background job %s failed", self.name)
+            self._stop.wait(self.interval_seconds)
@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import sys
@@ -8,17 +9,20 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     # Try relative imports first (for module execution)
-    from .database import engine
-    from . import models
-    from .routers import auth, post, analytics, dashboard, user, comments, interactions, subscribers
+    from .database import engine, async_engine
+    from . import models, rollup, activity_feed, query_stats, search, newsletter as newsletter_jobs, auth as auth_utils
+    from .view_buffer import view_buffer
+    from .routers import auth, post, analytics, dashboard, user, comments, interactions, subscribers, newsletter
 except ImportError:
     # Fall back to absolute imports (for direct execution)
-    from database import engine
-    import models
-    from routers import auth, post, analytics, dashboard, user, comments, interactions, subscribers
+    from database import engine, async_engine
+    import models, rollup, activity_feed, query_stats, search, newsletter as newsletter_jobs, auth as auth_utils
+    from view_buffer import view_buffer
+    from routers import auth, post, analytics, dashboard, user, comments, interactions, subscribers, newsletter
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
+search.ensure_index(engine)
 
 app = FastAPI(title="Blog API", version="1.0.0")
 
@@ -49,8 +53,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients read the pagination cursor and query stats
+    expose_headers=["X-Next-Cursor", "X-DB-Queries", "X-DB-Time"],
 )
 
+@app.exception_handler(auth_utils.PasswordHashingBusy)
+async def password_hashing_busy(request: Request, exc: auth_utils.PasswordHashingBusy):
+    # Shed login/register bursts instead of queueing them without bound
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many authentication requests, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.middleware("http")
+async def track_query_stats(request: Request, call_next):
+    stats = query_stats.start_request()
+    response = await call_next(request)
+    if os.getenv("ENVIRONMENT") != "production":
+        response.headers["X-DB-Queries"] = str(stats.queries)
+        response.headers["X-DB-Time"] = f"{stats.milliseconds}ms"
+    query_stats.check_budget(stats, f"{request.method} {request.url.path}")
+    return response
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(post.router)
@@ -60,6 +85,33 @@ app.include_router(user.router)
 app.include_router(comments.router)
 app.include_router(interactions.router)
 app.include_router(subscribers.router)
+app.include_router(newsletter.router)
+
+@app.on_event("startup")
+def start_background_jobs():
+    view_buffer.start()
+    rollup.scheduler.start()
+    activity_feed.scheduler.start()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    rollup.scheduler.stop()
+    activity_feed.scheduler.stop()
+    # Pause in-flight newsletter sends at their last checkpoint
+    newsletter_jobs.dispatcher.stop()
+    # Drain buffered views before the process exits
+    view_buffer.stop()
+
+@app.on_event("startup")
+async def open_async_engine():
+    # The pool's first connect runs one-time dialect setup under a lock, which
+    # concurrent first checkouts on the event loop (/dashboard/summary) deadlock on
+    async with async_engine.connect():
+        pass
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
 
 @app.get("/")
 def read_root():
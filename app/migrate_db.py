@@ -121,6 +121,120 @@ def migrate_database():
         """)
         print("Created/verified subscribers table")
         
+        # PostDailyStat and RollupWatermark tables (daily interaction rollup)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS post_daily_stats (
+                id INTEGER PRIMARY KEY,
+                post_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                views INTEGER NOT NULL DEFAULT 0,
+                unique_viewers INTEGER NOT NULL DEFAULT 0,
+                likes INTEGER NOT NULL DEFAULT 0,
+                shares INTEGER NOT NULL DEFAULT 0,
+                comments INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (post_id) REFERENCES posts (id),
+                CONSTRAINT uq_post_daily_stats_post_day UNIQUE (post_id, day)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_post_daily_stats_day ON post_daily_stats (day)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_watermarks (
+                name VARCHAR(50) PRIMARY KEY,
+                rolled_through DATETIME NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        print("Created/verified post_daily_stats and rollup_watermarks tables")
+
+        # RefreshToken table (hashed, rotating refresh tokens)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS refresh_tokens (
+                id INTEGER PRIMARY KEY,
+                token_hash VARCHAR(64) NOT NULL UNIQUE,
+                family_id VARCHAR(32) NOT NULL,
+                user_id INTEGER NOT NULL,
+                expires_at DATETIME NOT NULL,
+                revoked_at DATETIME,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens (family_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id)")
+        print("Created/verified refresh_tokens table")
+        
+        # NewsletterIssue table (issues and their delivery checkpoint)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS newsletter_issues (
+                id INTEGER PRIMARY KEY,
+                subject VARCHAR(200) NOT NULL,
+                body_text TEXT NOT NULL,
+                body_html TEXT,
+                post_id INTEGER,
+                created_by INTEGER NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'draft',
+                last_subscriber_id INTEGER NOT NULL DEFAULT 0,
+                sent_count INTEGER NOT NULL DEFAULT 0,
+                failed_count INTEGER NOT NULL DEFAULT 0,
+                started_at DATETIME,
+                finished_at DATETIME,
+                heartbeat_at DATETIME,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (post_id) REFERENCES posts (id),
+                FOREIGN KEY (created_by) REFERENCES users (id)
+            )
+        """)
+        print("Created/verified newsletter_issues table")
+        
+        # Activity table (materialized dashboard feed; python -m app.activity_feed backfill fills it)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS activities (
+                id INTEGER PRIMARY KEY,
+                owner_id INTEGER NOT NULL,
+                type VARCHAR(30) NOT NULL,
+                actor_id INTEGER,
+                post_id INTEGER,
+                comment_id INTEGER,
+                subscriber_id INTEGER,
+                detail VARCHAR(50),
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (owner_id) REFERENCES users (id),
+                FOREIGN KEY (actor_id) REFERENCES users (id),
+                FOREIGN KEY (post_id) REFERENCES posts (id),
+                FOREIGN KEY (comment_id) REFERENCES comments (id),
+                FOREIGN KEY (subscriber_id) REFERENCES subscribers (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_activities_owner_created_id ON activities (owner_id, created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_activities_post_id ON activities (post_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_activities_comment_id ON activities (comment_id)")
+        print("Created/verified activities table")
+        
+        # Subscriber emails are stored lowercased; merge rows differing only in case
+        cursor.execute("SELECT id, email, is_active FROM subscribers ORDER BY id")
+        kept = {}
+        duplicate_ids, reactivate_ids, renamed = [], [], []
+        for subscriber_id, email, is_active in cursor.fetchall():
+            normalized = email.strip().lower()
+            if normalized in kept:
+                duplicate_ids.append(subscriber_id)
+                if is_active:
+                    reactivate_ids.append(kept[normalized])
+                continue
+            kept[normalized] = subscriber_id
+            if normalized != email:
+                renamed.append((normalized, subscriber_id))
+        for subscriber_id in duplicate_ids:
+            cursor.execute("DELETE FROM activities WHERE subscriber_id = ?", (subscriber_id,))
+            cursor.execute("DELETE FROM subscribers WHERE id = ?", (subscriber_id,))
+        cursor.executemany(
+            "UPDATE subscribers SET is_active = 1, unsubscribed_at = NULL WHERE id = ?",
+            [(subscriber_id,) for subscriber_id in reactivate_ids]
+        )
+        cursor.executemany("UPDATE subscribers SET email = ? WHERE id = ?", renamed)
+        if duplicate_ids or renamed:
+            print(f"Lowercased {len(renamed)} subscriber emails, merged {len(duplicate_ids)} duplicates")
+        
         # Add updated_at column to comments table if it doesn't exist
         cursor.execute("PRAGMA table_info(comments)")
         comment_columns = [column[1] for column in cursor.fetchall()]
@@ -129,6 +243,68 @@ def migrate_database():
             cursor.execute("ALTER TABLE comments ADD COLUMN updated_at DATETIME")
             print("Added updated_at column to comments table")
         
+        # Composite indexes for the hot interaction predicates
+        # A user can like a post once; drop duplicates before enforcing it
+        cursor.execute("""
+            DELETE FROM post_likes WHERE id NOT IN (
+                SELECT MIN(id) FROM post_likes GROUP BY post_id, user_id
+            )
+        """)
+        if cursor.rowcount > 0:
+            print(f"Removed {cursor.rowcount} duplicate likes")
+        
+        indexes = [
+            ("ix_posts_author_published_created", "posts (author_id, is_published, created_at)"),
+            ("ix_comments_post_created", "comments (post_id, created_at)"),
+            ("ix_comments_author_created", "comments (author_id, created_at)"),
+            ("ix_comments_created_at", "comments (created_at)"),
+            ("ix_post_views_post_viewed", "post_views (post_id, viewed_at)"),
+            ("ix_post_views_post_user", "post_views (post_id, user_id)"),
+            ("ix_post_views_viewed_at", "post_views (viewed_at)"),
+            ("ix_post_likes_created_at", "post_likes (created_at)"),
+            ("ix_post_shares_post_shared", "post_shares (post_id, shared_at)"),
+            ("ix_post_shares_shared_at", "post_shares (shared_at)"),
+            ("ix_posts_published_created_id", "posts (is_published, created_at, id)"),
+            ("ix_posts_author_created_id", "posts (author_id, created_at, id)"),
+            ("ix_subscribers_active_subscribed_id", "subscribers (is_active, subscribed_at, id)"),
+            ("ix_post_views_user_viewed", "post_views (user_id, viewed_at)"),
+            ("ix_post_likes_user_created", "post_likes (user_id, created_at)"),
+        ]
+        for index_name, definition in indexes:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition}")
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_post_likes_post_user ON post_likes (post_id, user_id)"
+        )
+        print("Created/verified interaction indexes")
+
+        # Denormalized engagement counters on posts, backfilled from the interaction tables
+        cursor.execute("PRAGMA table_info(posts)")
+        post_columns = [column[1] for column in cursor.fetchall()]
+
+        counter_sources = [
+            ("view_count", "post_views"),
+            ("like_count", "post_likes"),
+            ("comment_count", "comments"),
+            ("share_count", "post_shares"),
+        ]
+        for column_name, source_table in counter_sources:
+            if column_name not in post_columns:
+                cursor.execute(f"ALTER TABLE posts ADD COLUMN {column_name} INTEGER NOT NULL DEFAULT 0")
+                cursor.execute(f"""
+                    UPDATE posts SET {column_name} = (
+                        SELECT COUNT(*) FROM {source_table} WHERE {source_table}.post_id = posts.id
+                    )
+                """)
+                print(f"Added and backfilled posts.{column_name}")
+
+        # Row versions behind the ETags of public post and comment reads
+        cursor.execute("PRAGMA table_info(comments)")
+        comment_columns = [column[1] for column in cursor.fetchall()]
+        for table_name, columns in (("posts", post_columns), ("comments", comment_columns)):
+            if "version" not in columns:
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+                print(f"Added {table_name}.version column")
+
         # Commit all changes
         conn.commit()
         print("Database migration completed successfully!")
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column
+from datetime import datetime
 
 try:
     from .database import Base
@@ -29,6 +30,12 @@ class User(Base):
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_author_published_created", "author_id", "is_published", "created_at"),
+        # Keyset pagination of the public and per-author post lists
+        Index("ix_posts_published_created_id", "is_published", "created_at", "id"),
+        Index("ix_posts_author_created_id", "author_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -40,11 +47,28 @@ class Post(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     author_id = Column(Integer, ForeignKey("users.id"))
     
+    # Denormalized engagement counters, kept in step by the interaction
+    # write paths and repaired by ``python -m app.counters``
+    view_count = Column(Integer, nullable=False, default=0, server_default="0")
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    share_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped by every update that does not set it; part of the ETag of
+    # public post reads. Not a lock: concurrent edits still last-write-wins
+    version = Column(
+        Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1
+    )
+    
     author = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post")
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_post_created", "post_id", "created_at"),
+        Index("ix_comments_author_created", "author_id", "created_at"),
+        Index("ix_comments_created_at", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
@@ -52,6 +76,9 @@ class Comment(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     post_id = Column(Integer, ForeignKey("posts.id"))
     author_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(
+        Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1
+    )
     
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
@@ -86,6 +113,12 @@ class UserSettings(Base):
 
 class PostView(Base):
     __tablename__ = "post_views"
+    __table_args__ = (
+        Index("ix_post_views_post_viewed", "post_id", "viewed_at"),
+        Index("ix_post_views_post_user", "post_id", "user_id"),
+        Index("ix_post_views_viewed_at", "viewed_at"),
+        Index("ix_post_views_user_viewed", "user_id", "viewed_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
@@ -99,6 +132,11 @@ class PostView(Base):
 
 class PostLike(Base):
     __tablename__ = "post_likes"
+    __table_args__ = (
+        Index("uq_post_likes_post_user", "post_id", "user_id", unique=True),
+        Index("ix_post_likes_created_at", "created_at"),
+        Index("ix_post_likes_user_created", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
@@ -110,6 +148,10 @@ class PostLike(Base):
 
 class PostShare(Base):
     __tablename__ = "post_shares"
+    __table_args__ = (
+        Index("ix_post_shares_post_shared", "post_id", "shared_at"),
+        Index("ix_post_shares_shared_at", "shared_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
@@ -122,6 +164,9 @@ class PostShare(Base):
 
 class Subscriber(Base):
     __tablename__ = "subscribers"
+    __table_args__ = (
+        Index("ix_subscribers_active_subscribed_id", "is_active", "subscribed_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(100), unique=True, index=True, nullable=False)
@@ -132,4 +177,98 @@ class Subscriber(Base):
     
     # Optional: Link to user if they have an account
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+class PostDailyStat(Base):
+    """Per-post, per-day interaction counts maintained by the rollup job"""
+    __tablename__ = "post_daily_stats"
+    __table_args__ = (
+        UniqueConstraint("post_id", "day", name="uq_post_daily_stats_post_day"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    day = Column(Date, nullable=False, index=True)
+    views = Column(Integer, nullable=False, default=0)
+    unique_viewers = Column(Integer, nullable=False, default=0)
+    likes = Column(Integer, nullable=False, default=0)
+    shares = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+
+class RollupWatermark(Base):
+    """How far each rollup has consumed the raw interaction tables"""
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String(50), primary_key=True)
+    # Raw rows before this instant are reflected in the rollup
+    rolled_through = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RefreshToken(Base):
+    """Hashed, single-use refresh token; rotations share a family_id"""
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    # SHA-256 hex digest; the token itself is only ever held by the client
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String(32), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    user = relationship("User")
+
+class NewsletterIssue(Base):
+    """A newsletter and the progress of its delivery to active subscribers"""
+    __tablename__ = "newsletter_issues"
+    
+    id = Column(Integer, primary_key=True)
+    subject = Column(String(200), nullable=False)
+    body_text = Column(Text, nullable=False)
+    body_html = Column(Text, nullable=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # draft -> sending -> sent; an interrupted send stays "sending" until resumed
+    status = Column(String(20), nullable=False, default="draft", server_default="draft")
+    # Checkpoint: every subscriber up to this id has been handled
+    last_subscriber_id = Column(Integer, nullable=False, default=0, server_default="0")
+    sent_count = Column(Integer, nullable=False, default=0, server_default="0")
+    failed_count = Column(Integer, nullable=False, default=0, server_default="0")
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Refreshed at every checkpoint; a stale "sending" issue may be taken over
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    @property
+    def messages_per_second(self) -> float:
+        """Average delivery rate since the send first started"""
+        if self.started_at is None:
+            return 0.0
+        seconds = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+        return round(self.sent_count / seconds, 1) if seconds > 0 else 0.0
+
+class Activity(Base):
+    """One event in an author's dashboard feed, written alongside the event itself"""
+    __tablename__ = "activities"
+    __table_args__ = (
+        # Every feed page is a range scan of one owner's newest rows
+        Index("ix_activities_owner_created_id", "owner_id", "created_at", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # post_created, draft_created, post_published, comment_received,
+    # like_received, share_received, subscriber_joined
+    type = Column(String(30), nullable=False)
+    actor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=True, index=True)
+    comment_id = Column(Integer, ForeignKey("comments.id"), nullable=True, index=True)
+    subscriber_id = Column(Integer, ForeignKey("subscribers.id"), nullable=True)
+    # Share platform
+    detail = Column(String(50), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    post = relationship("Post")
+    comment = relationship("Comment")
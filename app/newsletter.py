@@ -0,0 +1,387 @@
+"""
+Newsletter delivery to active subscribers.
+
+An issue is rendered once into a MIME message; each recipient only adds a
+``To`` header (and ``List-Unsubscribe`` when configured). Subscribers are
+read in primary-key keyset batches, and every batch is sent concurrently by
+``SMTP_POOL_SIZE`` worker threads sharing a pool of persistent SMTP
+connections. Transient failures (4xx replies, dropped connections) are
+retried with exponential backoff; permanent ones are counted as failed.
+
+Progress is checkpointed after every batch (``last_subscriber_id`` and the
+sent/failed counts), so an interrupted send resumes where it stopped;
+at most the batch in flight is delivered twice. While a send runs, a
+heartbeat thread keeps ``heartbeat_at`` fresh however long a batch takes,
+so only a dead worker's issue ever looks stale to ``claim``. Subscribers
+linked to an account whose ``newsletter_subscription`` setting is off are
+skipped.
+
+Usage:
+    python -m app.newsletter send <issue_id>
+
+For local runs, point ``SMTP_HOST``/``SMTP_PORT`` at a sink such as
+``python -m aiosmtpd -n -l localhost:1025``.
+"""
+import logging
+import os
+import queue
+import random
+import smtplib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.policy import SMTP
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+try:
+    from . import models, subscriber_io
+    from .database import SessionLocal
+except ImportError:
+    import models, subscriber_io
+    from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_FROM = os.getenv("SMTP_FROM", "newsletter@localhost")
+# Concurrent sends, and the number of SMTP connections kept open
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "8"))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", "3"))
+SMTP_RETRY_BACKOFF_SECONDS = float(os.getenv("SMTP_RETRY_BACKOFF_SECONDS", "1.0"))
+NEWSLETTER_BATCH_SIZE = int(os.getenv("NEWSLETTER_BATCH_SIZE", "500"))
+# A "sending" issue whose heartbeat is older than this may be resumed
+NEWSLETTER_STALE_SECONDS = int(os.getenv("NEWSLETTER_STALE_SECONDS", "300"))
+# How often a running send refreshes its heartbeat, batch in flight or not;
+# capped at a third of the stale window
+NEWSLETTER_HEARTBEAT_SECONDS = min(
+    int(os.getenv("NEWSLETTER_HEARTBEAT_SECONDS", "30")), max(NEWSLETTER_STALE_SECONDS // 3, 1)
+)
+# e.g. https://example.com/unsubscribe?email={email}
+NEWSLETTER_UNSUBSCRIBE_URL = os.getenv("NEWSLETTER_UNSUBSCRIBE_URL")
+
+
+class SMTPPool:
+    """Reusable SMTP connections, at most ``size`` of them in use at once"""
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self.size = size
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USERNAME:
+            smtp.login(SMTP_USERNAME, SMTP_PASSWORD or "")
+        return smtp
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                smtp = self._connect()
+            try:
+                yield smtp
+            except BaseException:
+                # The session state is unknown after an error; start over
+                self._discard(smtp)
+                raise
+            self._idle.put(smtp)
+
+    @staticmethod
+    def _discard(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.close()
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._discard(smtp)
+
+
+class RenderedIssue:
+    """An issue's message, serialized once and addressed per recipient"""
+
+    def __init__(self, issue: models.NewsletterIssue, sender: str = SMTP_FROM):
+        self.sender = sender
+        message = EmailMessage(policy=SMTP)
+        message["Subject"] = issue.subject
+        message["From"] = sender
+        message.set_content(issue.body_text)
+        if issue.body_html:
+            message.add_alternative(issue.body_html, subtype="html")
+        self._template = message.as_bytes()
+
+    def for_recipient(self, email: str) -> bytes:
+        headers = f"To: {email}\r\n"
+        if NEWSLETTER_UNSUBSCRIBE_URL:
+            headers += f"List-Unsubscribe: <{NEWSLETTER_UNSUBSCRIBE_URL.format(email=quote(email))}>\r\n"
+        return headers.encode() + self._template
+
+
+def _is_permanent(exc: Exception) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+def deliver(pool: SMTPPool, rendered: RenderedIssue, email: str, stop: threading.Event) -> bool:
+    """Send one message, retrying transient failures; returns whether it was accepted"""
+    message = rendered.for_recipient(email)
+    for attempt in range(SMTP_MAX_RETRIES + 1):
+        try:
+            with pool.connection() as smtp:
+                smtp.sendmail(rendered.sender, [email], message)
+            return True
+        except (smtplib.SMTPException, OSError) as exc:
+            if _is_permanent(exc) or attempt == SMTP_MAX_RETRIES:
+                logger.warning("Newsletter delivery to %s failed: %s", email, exc)
+                return False
+            delay = SMTP_RETRY_BACKOFF_SECONDS * 2 ** attempt * random.uniform(1.0, 1.5)
+            if stop.wait(delay):
+                return False
+    return False
+
+
+class NewsletterBusy(Exception):
+    """The issue is already sent, or being sent by a live worker"""
+
+
+def claim(db: Session, issue_id: int) -> None:
+    """Mark an issue as sending; raises NewsletterBusy if that is not allowed"""
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=NEWSLETTER_STALE_SECONDS)
+    Issue = models.NewsletterIssue
+    claimed = db.execute(
+        update(Issue)
+        .where(
+            Issue.id == issue_id,
+            or_(
+                Issue.status.in_(("draft", "paused")),
+                and_(
+                    Issue.status == "sending",
+                    or_(Issue.heartbeat_at.is_(None), Issue.heartbeat_at < stale_before),
+                ),
+            ),
+        )
+        .values(status="sending", heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        db.rollback()
+        raise NewsletterBusy()
+    db.execute(
+        update(Issue).where(Issue.id == issue_id, Issue.started_at.is_(None))
+        .values(started_at=now).execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+@contextmanager
+def _heartbeat(issue_id: int, interval: float = NEWSLETTER_HEARTBEAT_SECONDS):
+    """Refresh a sending issue's heartbeat every ``interval`` seconds while the block runs"""
+    Issue = models.NewsletterIssue
+    done = threading.Event()
+
+    def beat() -> None:
+        while not done.wait(interval):
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(Issue).where(Issue.id == issue_id, Issue.status == "sending")
+                    .values(heartbeat_at=datetime.utcnow()).execution_options(synchronize_session=False)
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("Newsletter issue %s heartbeat failed", issue_id)
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=beat, name=f"newsletter-{issue_id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+def _recipients():
+    """Subscriber rows with their account's newsletter setting"""
+    return select(
+        models.Subscriber.id,
+        models.Subscriber.email,
+        models.Subscriber.is_active,
+        models.UserSettings.newsletter_subscription,
+    ).outerjoin(models.UserSettings, models.UserSettings.user_id == models.Subscriber.user_id)
+
+
+def send_issue(issue_id: int, stop: Optional[threading.Event] = None, batch_size: int = NEWSLETTER_BATCH_SIZE) -> Dict:
+    """Deliver a claimed issue from its checkpoint on; returns a report"""
+    stop = stop or threading.Event()
+    Issue = models.NewsletterIssue
+    db = SessionLocal()
+    pool = SMTPPool()
+    started = time.perf_counter()
+    sent = failed = 0
+    try:
+        issue = db.get(Issue, issue_id)
+        rendered = RenderedIssue(issue)
+        last_id = issue.last_subscriber_id
+        db.commit()
+        batches = subscriber_io.subscriber_batches(db, _recipients(), batch_size, after_id=last_id)
+
+        with _heartbeat(issue_id), \
+                ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="newsletter") as executor:
+            while not stop.is_set():
+                rows = next(batches, None)
+                if not rows:
+                    break
+                recipients = [
+                    row.email for row in rows
+                    if row.is_active and row.newsletter_subscription is not False
+                ]
+                results = list(executor.map(lambda email: deliver(pool, rendered, email, stop), recipients))
+                if stop.is_set():
+                    # Not checkpointed: the whole batch is retried on resume
+                    break
+                batch_sent = sum(results)
+                batch_failed = len(results) - batch_sent
+                sent += batch_sent
+                failed += batch_failed
+                last_id = rows[-1].id
+
+                db.execute(
+                    update(Issue).where(Issue.id == issue_id).values(
+                        last_subscriber_id=last_id,
+                        sent_count=Issue.sent_count + batch_sent,
+                        failed_count=Issue.failed_count + batch_failed,
+                        heartbeat_at=datetime.utcnow(),
+                    ).execution_options(synchronize_session=False)
+                )
+                db.commit()
+
+        status = "paused" if stop.is_set() else "sent"
+        db.execute(
+            update(Issue).where(Issue.id == issue_id).values(
+                status=status,
+                finished_at=datetime.utcnow() if status == "sent" else None,
+                heartbeat_at=None,
+            ).execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Newsletter issue %s stopped; it resumes from its last checkpoint", issue_id)
+        raise
+    finally:
+        pool.close()
+        db.close()
+
+    seconds = time.perf_counter() - started
+    report = {
+        "issue_id": issue_id,
+        "status": status,
+        "sent": sent,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "messages_per_second": round(sent / seconds, 1) if seconds else float(sent),
+    }
+    logger.info("Newsletter issue %s %s: %d sent, %d failed, %.1f msg/s",
+                issue_id, status, sent, failed, report["messages_per_second"])
+    return report
+
+
+class NewsletterDispatcher:
+    """Runs claimed sends on background threads; stopping pauses them at a checkpoint"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._threads: Dict[int, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def start(self, issue_id: int) -> None:
+        with self._lock:
+            self._threads = {key: thread for key, thread in self._threads.items() if thread.is_alive()}
+            thread = threading.Thread(
+                target=self._run, args=(issue_id, self._stop), name=f"newsletter-{issue_id}", daemon=True
+            )
+            self._threads[issue_id] = thread
+        thread.start()
+
+    @staticmethod
+    def _run(issue_id: int, stop: threading.Event) -> None:
+        try:
+            send_issue(issue_id, stop)
+        except Exception:
+            pass  # logged by send_issue; the issue stays resumable
+
+    def stop(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            stop, self._stop = self._stop, threading.Event()
+            threads, self._threads = list(self._threads.values()), {}
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=timeout)
+
+
+dispatcher = NewsletterDispatcher()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2 or argv[0] != "send" or not argv[1].isdigit():
+        print("Usage: python -m app.newsletter send <issue_id>")
+        return 1
+
+    logging.basicConfig(level=logging.INFO)
+    issue_id = int(argv[1])
+    db = SessionLocal()
+    try:
+        if db.get(models.NewsletterIssue, issue_id) is None:
+            print(f"Newsletter issue {issue_id} not found")
+            return 1
+        claim(db, issue_id)
+    except NewsletterBusy:
+        print(f"Newsletter issue {issue_id} is already sent or being sent")
+        return 1
+    finally:
+        db.close()
+
+    report = send_issue(issue_id)
+    print(
+        f"Issue {issue_id} {report['status']}: {report['sent']} sent, {report['failed']} failed "
+        f"in {report['seconds']:.1f}s ({report['messages_per_second']:.1f} msg/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
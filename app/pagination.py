@@ -0,0 +1,143 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+Lists are ordered newest first on ``(timestamp, id)``, or oldest first for
+threads read top to bottom such as a post's comments. The cursor is an
+opaque token holding the last row's key; the next page continues strictly
+after it with a row-value comparison, so every page is an index range read
+no matter how deep it is and rows inserted meanwhile are neither skipped
+nor repeated. The token for the following page is returned in the
+``X-Next-Cursor`` response header, so list bodies keep their shape.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import String, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_key(*values) -> str:
+    """Opaque cursor token for a sort key of JSON-serializable values"""
+    payload = json.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_key(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    return encode_key(timestamp.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, row_id = decode_key(cursor)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _timestamp_bound(timestamp: datetime, dialect_name: str):
+    """Bind the cursor timestamp so it compares like the stored values.
+
+    SQLite keeps timestamps as text: ``CURRENT_TIMESTAMP`` defaults have no
+    fractional part while SQLAlchemy binds always add ``.ffffff``, which
+    would sort a row after its own key. Bind the text form the row was
+    stored with instead.
+    """
+    if dialect_name != "sqlite":
+        return timestamp
+    timestamp = timestamp.replace(tzinfo=None)
+    text = timestamp.strftime("%Y-%m-%d %H:%M:%S.%f" if timestamp.microsecond else "%Y-%m-%d %H:%M:%S")
+    return literal(text, String)
+
+
+def paginate(
+    statement,
+    timestamp_column,
+    id_column,
+    dialect_name: str,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    ascending: bool = False,
+):
+    """Order a Query or select() newest first (oldest first with
+    ``ascending``) and restrict it to one page.
+
+    One extra row is fetched so ``page_rows`` can tell whether another page
+    follows. ``skip`` is kept for clients still paging by offset; with a
+    cursor it is ignored.
+    """
+    if ascending:
+        statement = statement.order_by(timestamp_column.asc(), id_column.asc())
+    else:
+        statement = statement.order_by(timestamp_column.desc(), id_column.desc())
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        key = tuple_(timestamp_column, id_column)
+        bound = tuple_(_timestamp_bound(timestamp, dialect_name), row_id)
+        statement = statement.filter(key > bound if ascending else key < bound)
+    elif skip:
+        statement = statement.offset(skip)
+    return statement.limit(limit + 1)
+
+
+def page_rows(rows, timestamp_column, id_column, response: Response, limit: int):
+    """Trim the look-ahead row and set the next cursor header if there was one"""
+    rows = list(rows)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, timestamp_column.key), getattr(last, id_column.key)
+        )
+    return rows
+
+
+def keyset_page(
+    query,
+    timestamp_column,
+    id_column,
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    ascending: bool = False,
+):
+    """Return one page of a legacy ``Query`` and set the next cursor header"""
+    dialect_name = query.session.get_bind().dialect.name
+    rows = paginate(query, timestamp_column, id_column, dialect_name, cursor, skip, limit, ascending).all()
+    return page_rows(rows, timestamp_column, id_column, response, limit)
+
+
+async def keyset_page_async(
+    db: AsyncSession,
+    statement,
+    timestamp_column,
+    id_column,
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    ascending: bool = False,
+):
+    """Return one page of an ORM ``select()`` on an ``AsyncSession``"""
+    dialect_name = db.bind.dialect.name
+    result = await db.execute(
+        paginate(statement, timestamp_column, id_column, dialect_name, cursor, skip, limit, ascending)
+    )
+    return page_rows(result.scalars().all(), timestamp_column, id_column, response, limit)
@@ -0,0 +1,97 @@
+"""
+Per-request SQL statement counting.
+
+Cursor execution hooks on the sync and async engines add every statement and its duration
+to the ``QueryStats`` of the request being served (tracked in a context
+variable, which Starlette copies into the threadpool that runs sync
+routes and SQLAlchemy carries into its async greenlets). The HTTP middleware in ``main.py`` exposes the totals as
+``X-DB-Queries``/``X-DB-Time`` headers outside production, and routes can
+declare a ceiling with ``Depends(query_budget(n))``.
+"""
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+try:
+    from .database import engine, async_engine
+except ImportError:
+    from database import engine, async_engine
+
+logger = logging.getLogger(__name__)
+
+# Raise instead of logging when a route goes over its query budget (tests)
+QUERY_BUDGET_ENFORCE = os.getenv("QUERY_BUDGET_ENFORCE", "false").lower() in ("1", "true", "yes")
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class QueryStats:
+    """Statements issued and time spent in the database by one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.budget: Optional[int] = None
+
+    @property
+    def milliseconds(self) -> float:
+        return round(self.seconds * 1000, 2)
+
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.queries > self.budget
+
+
+def start_request() -> QueryStats:
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def check_budget(stats: QueryStats, label: str) -> None:
+    """Raise or log if the request issued more statements than it declared"""
+    if not stats.over_budget():
+        return
+    message = f"{label} issued {stats.queries} SQL statements, budget is {stats.budget}"
+    if QUERY_BUDGET_ENFORCE:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def query_budget(max_queries: int):
+    """Route dependency declaring the most statements a request may issue"""
+    async def declare_budget():
+        stats = _current.get()
+        if stats is not None:
+            stats.budget = max_queries
+    return declare_budget
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info["query_stats_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.pop("query_stats_started", None)
+    if stats is None or started is None:
+        return
+    stats.queries += 1
+    stats.seconds += time.perf_counter() - started
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
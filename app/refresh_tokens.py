@@ -0,0 +1,99 @@
+"""
+Rotating refresh tokens.
+
+Login hands out an opaque refresh token next to the short-lived access
+token. ``/auth/refresh`` trades it for a new pair with one indexed lookup
+instead of a password check. Only the SHA-256 of a token is stored. Every
+token is single use: rotating it revokes it and issues a successor in the
+same family, and presenting an already rotated token revokes the whole
+family, since it means the token was copied.
+"""
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+try:
+    from . import models
+except ImportError:
+    import models
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _revoke(*criteria):
+    return (
+        update(models.RefreshToken)
+        .where(models.RefreshToken.revoked_at.is_(None), *criteria)
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def revoke_for_user(user_id: int):
+    """Statement revoking every live refresh token of a user"""
+    return _revoke(models.RefreshToken.user_id == user_id)
+
+
+def issue(db: AsyncSession, user_id: int, family_id: Optional[str] = None) -> str:
+    """Add a new refresh token to the session and return its value"""
+    token = secrets.token_urlsafe(32)
+    db.add(models.RefreshToken(
+        token_hash=_hash(token),
+        family_id=family_id or secrets.token_hex(16),
+        user_id=user_id,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+async def prune_expired(db: AsyncSession, user_id: int) -> None:
+    """Delete a user's expired tokens so the table stays compact"""
+    await db.execute(delete(models.RefreshToken).where(
+        models.RefreshToken.user_id == user_id,
+        models.RefreshToken.expires_at < datetime.utcnow(),
+    ))
+
+
+async def rotate(db: AsyncSession, token: str) -> Optional[Tuple[models.User, str]]:
+    """Consume ``token`` and return its user and a successor, or None if refused.
+
+    Commits either way: a refused reuse revokes the token's family.
+    """
+    stored = (await db.execute(
+        select(models.RefreshToken)
+        .options(joinedload(models.RefreshToken.user))
+        .where(models.RefreshToken.token_hash == _hash(token))
+    )).scalars().first()
+    if stored is None or stored.expires_at < datetime.utcnow():
+        return None
+
+    # Conditional update so two concurrent rotations cannot both succeed
+    consumed = await db.execute(_revoke(models.RefreshToken.id == stored.id))
+    if consumed.rowcount != 1 or not stored.user.is_active:
+        await db.execute(_revoke(models.RefreshToken.family_id == stored.family_id))
+        await db.commit()
+        return None
+
+    successor = issue(db, stored.user_id, family_id=stored.family_id)
+    await db.commit()
+    return stored.user, successor
+
+
+async def revoke(db: AsyncSession, token: str) -> None:
+    """Log out: revoke the token's whole family"""
+    family_id = (await db.execute(
+        select(models.RefreshToken.family_id).where(models.RefreshToken.token_hash == _hash(token))
+    )).scalar()
+    if family_id is not None:
+        await db.execute(_revoke(models.RefreshToken.family_id == family_id))
+        await db.commit()
@@ -0,0 +1,220 @@
+"""
+Incremental daily rollup of post interactions into ``post_daily_stats``.
+
+The job keeps a watermark in ``rollup_watermarks``. Each run recomputes the
+days from the watermark's day up to now, so the partially rolled day is
+always rebuilt in full, and then moves the watermark forward.
+
+Usage:
+    python -m app.rollup run        # incremental, from the watermark
+    python -m app.rollup backfill   # rebuild every day from the raw tables
+"""
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, String, case, cast, delete, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+try:
+    from . import models
+    from .database import SessionLocal
+    from .jobs import PeriodicJob
+except ImportError:
+    import models
+    from database import SessionLocal
+    from jobs import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "post_daily_stats"
+
+# Rollup data older than this is not trusted by the read paths
+ROLLUP_MAX_LAG_SECONDS = int(os.getenv("ROLLUP_MAX_LAG_SECONDS", "900"))
+# How often the in-process job runs; 0 leaves scheduling to cron
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))
+BACKFILL_CHUNK_DAYS = 30
+# Rows committed shortly after the watermark moved may carry earlier
+# timestamps, so each run also rebuilds the day this long before it
+LATE_ARRIVAL_GRACE = timedelta(minutes=5)
+
+
+def _day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _day_expression(column, dialect_name: str):
+    if dialect_name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def _raw_events(since: datetime, until: datetime, dialect_name: str):
+    """Every interaction in ``[since, until)`` as ``(kind, post_id, day, viewer)``"""
+    view = models.PostView
+    viewer = case(
+        (view.user_id.isnot(None), literal("u:") + cast(view.user_id, String)),
+        else_=literal("ip:") + func.coalesce(view.ip_address, ""),
+    )
+    no_viewer = cast(literal(None), String)
+
+    sources = (
+        ("views", view.post_id, view.viewed_at, viewer),
+        ("likes", models.PostLike.post_id, models.PostLike.created_at, no_viewer),
+        ("comments", models.Comment.post_id, models.Comment.created_at, no_viewer),
+        ("shares", models.PostShare.post_id, models.PostShare.shared_at, no_viewer),
+    )
+    return union_all(*[
+        select(
+            literal(kind).label("kind"),
+            post_column.label("post_id"),
+            _day_expression(time_column, dialect_name).label("day"),
+            viewer_column.label("viewer"),
+        ).where(time_column >= since, time_column < until)
+        for kind, post_column, time_column, viewer_column in sources
+    ]).subquery("raw_events")
+
+
+def _rebuild_days(db: Session, since: datetime, until: datetime) -> None:
+    """Replace the rollup rows for every day in ``[since, until)``"""
+    dialect_name = db.get_bind().dialect.name
+    events = _raw_events(since, until, dialect_name)
+
+    def count(kind):
+        return func.sum(case((events.c.kind == kind, 1), else_=0))
+
+    rollup = (
+        select(
+            events.c.post_id,
+            events.c.day,
+            count("views"),
+            func.count(func.distinct(events.c.viewer)),
+            count("likes"),
+            count("shares"),
+            count("comments"),
+        )
+        .where(events.c.post_id.isnot(None))
+        .group_by(events.c.post_id, events.c.day)
+    )
+
+    # ``until`` is exclusive, so a midnight bound does not touch its own day
+    last_day = (until - timedelta(microseconds=1)).date()
+    stats = models.PostDailyStat
+    db.execute(delete(stats).where(
+        stats.day >= literal(since.date(), Date),
+        stats.day <= literal(last_day, Date),
+    ))
+    db.execute(insert(stats).from_select(
+        ["post_id", "day", "views", "unique_viewers", "likes", "shares", "comments"],
+        rollup,
+    ))
+
+
+def _watermark(db: Session) -> Optional[models.RollupWatermark]:
+    return db.get(models.RollupWatermark, WATERMARK_NAME)
+
+
+def _advance_watermark(db: Session, rolled_through: datetime) -> None:
+    watermark = _watermark(db)
+    if watermark is None:
+        db.add(models.RollupWatermark(name=WATERMARK_NAME, rolled_through=rolled_through))
+    else:
+        watermark.rolled_through = rolled_through
+
+
+def _earliest_event(db: Session) -> Optional[datetime]:
+    candidates = [
+        db.query(func.min(models.PostView.viewed_at)).scalar(),
+        db.query(func.min(models.PostLike.created_at)).scalar(),
+        db.query(func.min(models.Comment.created_at)).scalar(),
+        db.query(func.min(models.PostShare.shared_at)).scalar(),
+    ]
+    candidates = [candidate for candidate in candidates if candidate is not None]
+    return min(candidates).replace(tzinfo=None) if candidates else None
+
+
+def run_rollup(db: Session, now: Optional[datetime] = None) -> datetime:
+    """Roll up everything since the watermark; returns the new watermark.
+
+    Without a watermark this falls back to a full backfill.
+    """
+    watermark = _watermark(db)
+    if watermark is None:
+        return backfill(db, now=now)
+
+    now = now or datetime.utcnow()
+    since = _day_start(watermark.rolled_through.replace(tzinfo=None) - LATE_ARRIVAL_GRACE)
+    _rebuild_days(db, since, now)
+    _advance_watermark(db, now)
+    db.commit()
+    return now
+
+
+def backfill(db: Session, now: Optional[datetime] = None, chunk_days: int = BACKFILL_CHUNK_DAYS) -> datetime:
+    """Rebuild the whole rollup from the raw tables, one chunk per transaction"""
+    now = now or datetime.utcnow()
+    earliest = _earliest_event(db)
+    day = _day_start(earliest) if earliest else _day_start(now)
+
+    while day < now:
+        chunk_end = min(day + timedelta(days=chunk_days), now)
+        _rebuild_days(db, day, chunk_end)
+        _advance_watermark(db, chunk_end)
+        db.commit()
+        logger.info("Rolled up post interactions through %s", chunk_end.isoformat())
+        day = chunk_end
+
+    _advance_watermark(db, now)
+    db.commit()
+    return now
+
+
+def fresh_cutoff(db: Session, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Start of the first day the rollup does not fully cover, if it is fresh.
+
+    Read paths use rollup rows for days before the cutoff and the raw
+    tables from the cutoff on. ``None`` means the rollup is missing or too
+    stale and everything should be read from the raw tables.
+    """
+    watermark = _watermark(db)
+    if watermark is None:
+        return None
+    now = now or datetime.utcnow()
+    rolled_through = watermark.rolled_through.replace(tzinfo=None)
+    if (now - rolled_through).total_seconds() > ROLLUP_MAX_LAG_SECONDS:
+        return None
+    return _day_start(rolled_through)
+
+
+def _run_scheduled() -> None:
+    db = SessionLocal()
+    try:
+        run_rollup(db)
+    finally:
+        db.close()
+
+
+scheduler = PeriodicJob("post-rollup", ROLLUP_INTERVAL_SECONDS, _run_scheduled)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "run"
+    if command not in ("run", "backfill"):
+        print("Usage: python -m app.rollup [run|backfill]")
+        return 1
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        rolled_through = backfill(db) if command == "backfill" else run_rollup(db)
+        print(f"Post interaction rollup complete through {rolled_through.isoformat()}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,34 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 try:
-    from .. import models, schemas, auth
-    from ..database import get_db
+    from .. import models, schemas, auth, refresh_tokens
+    from ..database import get_async_db
+    from ..dependencies import invalidate_user
 except ImportError:
-    import models, schemas, auth
-    from database import get_db
+    import models, schemas, auth, refresh_tokens
+    from database import get_async_db
+    from dependencies import invalidate_user
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(
-        (models.User.email == user.email) | (models.User.username == user.username)
-    ).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(
+        select(models.User).where(
+            or_(models.User.email == user.email, models.User.username == user.username)
+        )
+    )).scalars().first()
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email or username already registered"
         )
     
-    hashed_password = auth.get_password_hash(user.password)
+    # bcrypt runs on the hashing pool, not the request threadpool
+    hashed_password = await auth.get_password_hash_async(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -30,21 +36,57 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(
+        select(models.User).where(models.User.username == form_data.username)
+    )).scalars().first()
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = await auth.verify_password_async(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    
+    # Stored hash used an outdated scheme or cost factor; replace it
+    if new_hash:
+        user.hashed_password = new_hash
+        invalidate_user(user.username)
+    
+    await refresh_tokens.prune_expired(db, user.id)
+    refresh_token = refresh_tokens.issue(db, user.id)
+    await db.commit()
+    return _token_pair(user.username, refresh_token)
+
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh(request: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Trade a refresh token for a new access token and refresh token"""
+    rotated = await refresh_tokens.rotate(db, request.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user, refresh_token = rotated
+    return _token_pair(user.username, refresh_token)
+
+@router.post("/logout")
+async def logout(request: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Revoke a refresh token and every token rotated from it"""
+    await refresh_tokens.revoke(db, request.refresh_token)
+    return {"message": "Logged out successfully"}
+
+def _token_pair(username: str, refresh_token: str):
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": username}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
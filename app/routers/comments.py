@@ -1,36 +1,59 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 try:
-    from .. import models, schemas
-    from ..database import get_db
-    from ..dependencies import get_current_active_user
+    from .. import models, schemas, counters, http_cache, activity_feed
+    from ..database import get_db, get_async_db
+    from ..query_stats import query_budget
+    from ..pagination import keyset_page_async, paginate
+    from ..dependencies import get_current_active_user, get_current_active_user_async
 except ImportError:
-    import models, schemas
-    from database import get_db
-    from dependencies import get_current_active_user
+    import models, schemas, counters, http_cache, activity_feed
+    from database import get_db, get_async_db
+    from query_stats import query_budget
+    from pagination import keyset_page_async, paginate
+    from dependencies import get_current_active_user, get_current_active_user_async
 
 router = APIRouter(prefix="/comments", tags=["Comments"])
 
-@router.get("/post/{post_id}", response_model=List[schemas.CommentResponse])
-def get_post_comments(
+@router.get("/post/{post_id}", response_model=List[schemas.CommentResponse], dependencies=[Depends(query_budget(3))])
+async def get_post_comments(
     post_id: int,
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get comments for a specific post"""
+    """Get comments for a specific post, oldest first"""
     
     # Verify post exists
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
+    post_exists = (await db.execute(
+        select(models.Post.id).where(models.Post.id == post_id)
+    )).first()
+    if not post_exists:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    comments = db.query(models.Comment).filter(
-        models.Comment.post_id == post_id
-    ).offset(skip).limit(limit).all()
+    on_post = models.Comment.post_id == post_id
+    fingerprint = (await db.execute(paginate(
+        http_cache.fingerprint(models.Comment).where(on_post),
+        models.Comment.created_at, models.Comment.id, db.bind.dialect.name, cursor, skip, limit,
+        ascending=True
+    ))).all()
+    not_modified = http_cache.conditional_response(
+        request, response, http_cache.compute_etag(fingerprint)
+    )
+    if not_modified:
+        return not_modified
     
-    return comments
+    stmt = select(models.Comment).options(joinedload(models.Comment.author)).where(on_post)
+    return await keyset_page_async(
+        db, stmt, models.Comment.created_at, models.Comment.id, response,
+        cursor=cursor, skip=skip, limit=limit, ascending=True
+    )
 
 @router.post("/", response_model=schemas.CommentResponse)
 def create_comment(
@@ -54,6 +77,11 @@ def create_comment(
         author_id=current_user.id
     )
     db.add(db_comment)
+    counters.adjust(db, comment.post_id, "comments", 1)
+    activity_feed.record(
+        db, post.author_id, activity_feed.COMMENT_RECEIVED,
+        actor_id=current_user.id, comment=db_comment
+    )
     db.commit()
     db.refresh(db_comment)
     
@@ -68,7 +96,7 @@ def update_comment(
 ):
     """Update a comment"""
     
-    db_comment = db.query(models.Comment).filter(
+    db_comment = db.query(models.Comment).options(joinedload(models.Comment.author)).filter(
         models.Comment.id == comment_id
     ).first()
     if not db_comment:
@@ -111,21 +139,27 @@ def delete_comment(
         not current_user.is_admin):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
+    activity_feed.forget(db, comment_id=comment_id)
     db.delete(db_comment)
+    counters.adjust(db, db_comment.post_id, "comments", -1)
     db.commit()
     return {"message": "Comment deleted successfully"}
 
-@router.get("/my-comments", response_model=List[schemas.CommentResponse])
-def get_my_comments(
+@router.get("/my-comments", response_model=List[schemas.CommentResponse], dependencies=[Depends(query_budget(2))])
+async def get_my_comments(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
-    current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: schemas.User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user's comments"""
     
-    comments = db.query(models.Comment).filter(
+    stmt = select(models.Comment).options(joinedload(models.Comment.author)).where(
         models.Comment.author_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    
-    return comments
\ No newline at end of file
+    )
+    return await keyset_page_async(
+        db, stmt, models.Comment.created_at, models.Comment.id, response,
+        cursor=cursor, skip=skip, limit=limit
+    )
\ No newline at end of file
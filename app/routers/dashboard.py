@@ -1,187 +1,164 @@
-from typing import List, Dict
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import os
+from typing import List, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session, contains_eager, joinedload
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta
 try:
-    from .. import models, schemas
-    from ..database import get_db
-    from ..dependencies import get_current_active_user
+    from .. import models, schemas, aggregates, activity_feed
+    from ..database import get_db, AsyncSessionLocal, ASYNC_DATABASE_URL
+    from ..query_stats import query_budget
+    from ..dependencies import get_current_active_user, get_current_active_user_async
 except ImportError:
-    import models, schemas
-    from database import get_db
-    from dependencies import get_current_active_user
+    import models, schemas, aggregates, activity_feed
+    from database import get_db, AsyncSessionLocal, ASYNC_DATABASE_URL
+    from query_stats import query_budget
+    from dependencies import get_current_active_user, get_current_active_user_async
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
-@router.get("/stats")
+# Load /dashboard/summary sections on separate connections at the same time.
+# An in-memory SQLite database is private to one connection, so with one (or
+# with this turned off) the sections load one after another on one session.
+DASHBOARD_CONCURRENT_SECTIONS = (
+    os.getenv("DASHBOARD_CONCURRENT_SECTIONS", "true").lower() in ("1", "true", "yes")
+    and ":memory:" not in ASYNC_DATABASE_URL
+)
+
+def load_stats(db: Session, user_id: int) -> Dict:
+    # Post and subscriber counts in one query
+    counts = aggregates.post_and_subscriber_counts(db, user_id)
+    
+    # All-time interaction totals on published posts, from the post counters
+    totals = aggregates.all_time_totals(db, user_id)
+    
+    return {
+        "totalPosts": counts["total_posts"],
+        "publishedPosts": counts["published_posts"],
+        "draftPosts": counts["draft_posts"],
+        "totalViews": totals["views"],
+        "totalLikes": totals["likes"],
+        "totalComments": totals["comments"],
+        "totalSubscribers": counts["total_subscribers"]
+    }
+
+def load_recent_posts(db: Session, user_id: int, limit: int) -> List[models.Post]:
+    return db.query(models.Post).filter(
+        models.Post.author_id == user_id
+    ).order_by(desc(models.Post.created_at)).limit(limit).all()
+
+def load_recent_comments(db: Session, user_id: int, limit: int) -> List[models.Comment]:
+    """Latest comments on the user's posts, with their post and author"""
+    return db.query(models.Comment).join(models.Comment.post).options(
+        contains_eager(models.Comment.post),
+        joinedload(models.Comment.author)
+    ).filter(
+        models.Post.author_id == user_id
+    ).order_by(desc(models.Comment.created_at)).limit(limit).all()
+
+def serialize_post(post: models.Post) -> Dict:
+    return {
+        "id": post.id,
+        "title": post.title,
+        "slug": post.slug,
+        "summary": post.summary,
+        "is_published": post.is_published,
+        "created_at": post.created_at.isoformat(),
+        "updated_at": post.updated_at.isoformat() if post.updated_at else None,
+        "views": post.view_count,
+        "likes": post.like_count,
+        "comments": post.comment_count
+    }
+
+def serialize_comment(comment: models.Comment) -> Dict:
+    return {
+        "id": comment.id,
+        "content": comment.content,
+        "created_at": comment.created_at.isoformat(),
+        "author": {
+            "id": comment.author.id,
+            "username": comment.author.username,
+            "full_name": comment.author.full_name
+        },
+        "post": {
+            "id": comment.post.id,
+            "title": comment.post.title,
+            "slug": comment.post.slug
+        }
+    }
+
+@router.get("/stats", dependencies=[Depends(query_budget(3))])
 def get_dashboard_stats(
     current_user: schemas.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Get dashboard statistics for the current user"""
-    
-    # Get total posts count
-    total_posts = db.query(models.Post).filter(
-        models.Post.author_id == current_user.id
-    ).count()
-    
-    # Get published posts count
-    published_posts = db.query(models.Post).filter(
-        models.Post.author_id == current_user.id,
-        models.Post.is_published == True
-    ).count()
-    
-    # Get draft posts count
-    draft_posts = total_posts - published_posts
-    
-    # Get total comments on user's posts
-    total_comments = db.query(models.Comment).join(models.Post).filter(
-        models.Post.author_id == current_user.id
-    ).count()
-    
-    # Get real analytics data
-    user_post_ids = [post.id for post in db.query(models.Post).filter(
-        models.Post.author_id == current_user.id,
-        models.Post.is_published == True
-    ).all()]
-    
-    total_views = db.query(models.PostView).filter(
-        models.PostView.post_id.in_(user_post_ids)
-    ).count() if user_post_ids else 0
-    
-    total_likes = db.query(models.PostLike).filter(
-        models.PostLike.post_id.in_(user_post_ids)
-    ).count() if user_post_ids else 0
-    
-    # Get total subscribers
-    total_subscribers = db.query(models.Subscriber).filter(
-        models.Subscriber.is_active == True
-    ).count()
-    
-    return {
-        "totalPosts": total_posts,
-        "publishedPosts": published_posts,
-        "draftPosts": draft_posts,
-        "totalViews": total_views,
-        "totalLikes": total_likes,
-        "totalComments": total_comments,
-        "totalSubscribers": total_subscribers
-    }
+    return load_stats(db, current_user.id)
 
-@router.get("/recent-posts")
+@router.get("/recent-posts", dependencies=[Depends(query_budget(2))])
 def get_recent_posts(
     limit: int = 5,
     current_user: schemas.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Get recent posts for the dashboard"""
-    
-    posts = db.query(models.Post).filter(
-        models.Post.author_id == current_user.id
-    ).order_by(desc(models.Post.created_at)).limit(limit).all()
-    
-    recent_posts = []
-    for post in posts:
-        recent_posts.append({
-            "id": post.id,
-            "title": post.title,
-            "slug": post.slug,
-            "summary": post.summary,
-            "is_published": post.is_published,
-            "created_at": post.created_at.isoformat(),
-            "updated_at": post.updated_at.isoformat() if post.updated_at else None,
-            "views": db.query(models.PostView).filter(models.PostView.post_id == post.id).count(),
-            "likes": db.query(models.PostLike).filter(models.PostLike.post_id == post.id).count(),
-            "comments": len(post.comments)
-        })
-    
-    return {"recentPosts": recent_posts}
+    posts = load_recent_posts(db, current_user.id, limit)
+    return {"recentPosts": [serialize_post(post) for post in posts]}
 
-@router.get("/recent-comments")
+@router.get("/recent-comments", dependencies=[Depends(query_budget(2))])
 def get_recent_comments(
     limit: int = 5,
     current_user: schemas.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Get recent comments on user's posts"""
-    
-    comments = db.query(models.Comment).join(models.Post).filter(
-        models.Post.author_id == current_user.id
-    ).order_by(desc(models.Comment.created_at)).limit(limit).all()
-    
-    recent_comments = []
-    for comment in comments:
-        recent_comments.append({
-            "id": comment.id,
-            "content": comment.content,
-            "created_at": comment.created_at.isoformat(),
-            "author": {
-                "id": comment.author.id,
-                "username": comment.author.username,
-                "full_name": comment.author.full_name
-            },
-            "post": {
-                "id": comment.post.id,
-                "title": comment.post.title,
-                "slug": comment.post.slug
-            }
-        })
-    
-    return {"recentComments": recent_comments}
+    comments = load_recent_comments(db, current_user.id, limit)
+    return {"recentComments": [serialize_comment(comment) for comment in comments]}
 
-@router.get("/activity-feed")
+@router.get("/activity-feed", dependencies=[Depends(query_budget(2))])
 def get_activity_feed(
+    response: Response,
     limit: int = 10,
+    cursor: Optional[str] = None,
     current_user: schemas.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get activity feed for the dashboard"""
-    
-    # Get recent posts and comments, then combine and sort
-    recent_posts = db.query(models.Post).filter(
-        models.Post.author_id == current_user.id
-    ).order_by(desc(models.Post.created_at)).limit(5).all()
-    
-    recent_comments = db.query(models.Comment).join(models.Post).filter(
-        models.Post.author_id == current_user.id
-    ).order_by(desc(models.Comment.created_at)).limit(5).all()
-    
-    activities = []
-    
-    # Add posts to activity feed
-    for post in recent_posts:
-        activities.append({
-            "id": f"post_{post.id}",
-            "type": "post_created" if post.is_published else "draft_created",
-            "title": f"{'Published' if post.is_published else 'Created draft'}: {post.title}",
-            "description": post.summary or post.content[:100] + "...",
-            "timestamp": post.created_at.isoformat(),
-            "data": {
-                "post_id": post.id,
-                "post_title": post.title,
-                "post_slug": post.slug
-            }
-        })
-    
-    # Add comments to activity feed
-    for comment in recent_comments:
-        activities.append({
-            "id": f"comment_{comment.id}",
-            "type": "comment_received",
-            "title": f"New comment on: {comment.post.title}",
-            "description": f"{comment.author.username}: {comment.content[:100]}...",
-            "timestamp": comment.created_at.isoformat(),
-            "data": {
-                "comment_id": comment.id,
-                "post_id": comment.post.id,
-                "post_title": comment.post.title,
-                "commenter": comment.author.username
-            }
-        })
-    
-    # Sort by timestamp and limit
-    activities.sort(key=lambda x: x["timestamp"], reverse=True)
-    activities = activities[:limit]
+    """Get activity feed for the dashboard; older pages follow the X-Next-Cursor header"""
+    return {"activities": activity_feed.feed_page(db, current_user.id, response, cursor, limit)}
+
+@router.get("/summary", dependencies=[Depends(query_budget(6))])
+async def get_dashboard_summary(
+    response: Response,
+    limit: int = 5,
+    activity_limit: int = 10,
+    current_user: schemas.User = Depends(get_current_active_user_async)
+):
+    """Stats, recent posts, recent comments and the first activity feed page in one response.
+
+    X-Next-Cursor continues the activity feed on /dashboard/activity-feed.
+    """
+    user_id = current_user.id
+    sections = (
+        lambda session: load_stats(session, user_id),
+        lambda session: load_recent_posts(session, user_id, limit),
+        lambda session: load_recent_comments(session, user_id, limit),
+        lambda session: activity_feed.feed_page(session, user_id, response, limit=activity_limit),
+    )
+    
+    async def run_section(section):
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(section)
+    
+    if DASHBOARD_CONCURRENT_SECTIONS:
+        stats, posts, comments, activities = await asyncio.gather(*(run_section(section) for section in sections))
+    else:
+        async with AsyncSessionLocal() as session:
+            stats, posts, comments, activities = [await session.run_sync(section) for section in sections]
     
-    return {"activities": activities}
\ No newline at end of file
+    return {
+        "stats": stats,
+        "recentPosts": [serialize_post(post) for post in posts],
+        "recentComments": [serialize_comment(comment) for comment in comments],
+        "activities": activities
+    }
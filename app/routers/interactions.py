@@ -1,18 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 try:
-    from .. import models, schemas
-    from ..database import get_db
-    from ..dependencies import get_current_active_user
+    from .. import models, schemas, counters, activity_feed, subscriber_io
+    from ..database import get_db, get_async_db
+    from ..query_stats import query_budget
+    from ..dependencies import get_current_active_user, get_current_active_user_async, get_admin_user
+    from ..view_buffer import view_buffer
+    from ..cache import TTLCache
 except ImportError:
-    import models, schemas
-    from database import get_db
-    from dependencies import get_current_active_user
+    import models, schemas, counters, activity_feed, subscriber_io
+    from database import get_db, get_async_db
+    from query_stats import query_budget
+    from dependencies import get_current_active_user, get_current_active_user_async, get_admin_user
+    from view_buffer import view_buffer
+    from cache import TTLCache
+from datetime import datetime
 from typing import Optional
+import os
 
 router = APIRouter(prefix="/interactions", tags=["Post Interactions"])
 
+# A viewer's repeat views of a post count once per window
+VIEW_DEDUPE_WINDOW_SECONDS = int(os.getenv("VIEW_DEDUPE_WINDOW_SECONDS", "1800"))
+VIEW_DEDUPE_MAX_ENTRIES = int(os.getenv("VIEW_DEDUPE_MAX_ENTRIES", "100000"))
+
+recent_views = TTLCache(max_entries=VIEW_DEDUPE_MAX_ENTRIES, ttl=VIEW_DEDUPE_WINDOW_SECONDS)
+
 @router.post("/view")
 def track_post_view(
     view_data: schemas.PostViewCreate,
@@ -22,6 +39,17 @@ def track_post_view(
 ):
     """Track a post view"""
     
+    # Get client IP and user agent
+    client_ip = request.client.host
+    user_agent = request.headers.get("user-agent", "")
+    
+    # Repeat views by the same viewer inside the dedupe window are answered
+    # from memory without touching the database
+    viewer = f"user:{current_user.id}" if current_user else f"ip:{client_ip}"
+    dedupe_key = (view_data.post_id, viewer)
+    if dedupe_key in recent_views:
+        return {"message": "View already tracked"}
+    
     # Verify post exists and is published
     post = db.query(models.Post).filter(
         models.Post.id == view_data.post_id,
@@ -30,40 +58,31 @@ def track_post_view(
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    # Get client IP and user agent
-    client_ip = request.client.host
-    user_agent = request.headers.get("user-agent", "")
+    if not recent_views.add(dedupe_key):
+        return {"message": "View already tracked"}
     
-    # Check if this user/IP already viewed this post recently (prevent spam)
-    existing_view = None
-    if current_user:
-        existing_view = db.query(models.PostView).filter(
-            models.PostView.post_id == view_data.post_id,
-            models.PostView.user_id == current_user.id
-        ).first()
-    else:
-        # For anonymous users, check by IP (you might want to add time-based filtering)
-        existing_view = db.query(models.PostView).filter(
-            models.PostView.post_id == view_data.post_id,
-            models.PostView.ip_address == client_ip,
-            models.PostView.user_id.is_(None)
-        ).first()
-    
-    if not existing_view:
-        # Create new view record
-        db_view = models.PostView(
-            post_id=view_data.post_id,
-            user_id=current_user.id if current_user else None,
-            ip_address=client_ip,
-            user_agent=user_agent
-        )
-        db.add(db_view)
-        db.commit()
-        db.refresh(db_view)
-        
-        return {"message": "View tracked successfully", "view_id": db_view.id}
+    view = {
+        "post_id": view_data.post_id,
+        "user_id": current_user.id if current_user else None,
+        "ip_address": client_ip,
+        "user_agent": user_agent,
+        "viewed_at": datetime.utcnow()
+    }
+    
+    # Hand the row to the write-behind buffer, or write it inline if the
+    # buffer is not running (e.g. outside the app lifecycle)
+    if not view_buffer.running:
+        view_buffer.write([view])
+    elif not view_buffer.submit(view):
+        recent_views.pop(dedupe_key)
+        return {"message": "View not tracked, buffer is full", "queued": False}
     
-    return {"message": "View already tracked"}
+    return {"message": "View tracked successfully", "queued": True}
+
+@router.get("/view-buffer")
+def get_view_buffer_stats(current_user: schemas.User = Depends(get_admin_user)):
+    """Get queue depth, drop and flush latency counters for view tracking"""
+    return view_buffer.stats()
 
 @router.post("/like")
 def toggle_post_like(
@@ -90,6 +109,10 @@ def toggle_post_like(
     if existing_like:
         # Unlike the post
         db.delete(existing_like)
+        counters.adjust(db, like_data.post_id, "likes", -1)
+        activity_feed.forget(
+            db, type=activity_feed.LIKE_RECEIVED, post_id=like_data.post_id, actor_id=current_user.id
+        )
         db.commit()
         return {"message": "Post unliked", "liked": False}
     else:
@@ -99,7 +122,17 @@ def toggle_post_like(
             user_id=current_user.id
         )
         db.add(db_like)
-        db.commit()
+        counters.adjust(db, like_data.post_id, "likes", 1)
+        activity_feed.record(
+            db, post.author_id, activity_feed.LIKE_RECEIVED,
+            actor_id=current_user.id, post_id=like_data.post_id
+        )
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent request already liked it (unique post_id, user_id)
+            db.rollback()
+            return {"message": "Post liked", "liked": True}
         db.refresh(db_like)
         return {"message": "Post liked", "liked": True, "like_id": db_like.id}
 
@@ -126,67 +159,67 @@ def track_post_share(
         platform=share_data.platform
     )
     db.add(db_share)
+    counters.adjust(db, share_data.post_id, "shares", 1)
+    activity_feed.record(
+        db, post.author_id, activity_feed.SHARE_RECEIVED,
+        actor_id=current_user.id if current_user else None,
+        post_id=share_data.post_id, detail=share_data.platform
+    )
     db.commit()
     db.refresh(db_share)
     
     return {"message": "Share tracked successfully", "share_id": db_share.id}
 
-@router.get("/post/{post_id}/stats")
-def get_post_interaction_stats(
+@router.get("/post/{post_id}/stats", dependencies=[Depends(query_budget(1))])
+async def get_post_interaction_stats(
     post_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get interaction stats for a specific post"""
     
-    # Verify post exists
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
+    # Denormalized counters make this a single primary-key read
+    stats = (await db.execute(
+        select(
+            models.Post.view_count,
+            models.Post.like_count,
+            models.Post.comment_count,
+            models.Post.share_count
+        ).where(models.Post.id == post_id)
+    )).first()
+    if not stats:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    # Get stats
-    views_count = db.query(models.PostView).filter(
-        models.PostView.post_id == post_id
-    ).count()
-    
-    likes_count = db.query(models.PostLike).filter(
-        models.PostLike.post_id == post_id
-    ).count()
-    
-    comments_count = db.query(models.Comment).filter(
-        models.Comment.post_id == post_id
-    ).count()
-    
-    shares_count = db.query(models.PostShare).filter(
-        models.PostShare.post_id == post_id
-    ).count()
-    
     return {
         "post_id": post_id,
-        "views": views_count,
-        "likes": likes_count,
-        "comments": comments_count,
-        "shares": shares_count
+        "views": stats.view_count,
+        "likes": stats.like_count,
+        "comments": stats.comment_count,
+        "shares": stats.share_count
     }
 
-@router.get("/post/{post_id}/user-interactions")
-def get_user_post_interactions(
+@router.get("/post/{post_id}/user-interactions", dependencies=[Depends(query_budget(3))])
+async def get_user_post_interactions(
     post_id: int,
-    current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user's interactions with a specific post"""
     
     # Check if user liked the post
-    has_liked = db.query(models.PostLike).filter(
-        models.PostLike.post_id == post_id,
-        models.PostLike.user_id == current_user.id
-    ).first() is not None
+    has_liked = (await db.execute(
+        select(models.PostLike.id).where(
+            models.PostLike.post_id == post_id,
+            models.PostLike.user_id == current_user.id
+        ).limit(1)
+    )).first() is not None
     
     # Check if user viewed the post
-    has_viewed = db.query(models.PostView).filter(
-        models.PostView.post_id == post_id,
-        models.PostView.user_id == current_user.id
-    ).first() is not None
+    has_viewed = (await db.execute(
+        select(models.PostView.id).where(
+            models.PostView.post_id == post_id,
+            models.PostView.user_id == current_user.id
+        ).limit(1)
+    )).first() is not None
     
     return {
         "post_id": post_id,
@@ -201,9 +234,15 @@ def subscribe_to_newsletter(
 ):
     """Subscribe to newsletter"""
     
+    # Stored the way bulk imports store it, so both dedupe on one form
+    try:
+        email = subscriber_io.normalize_email(subscriber_data.email)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
     # Check if email already exists
     existing_subscriber = db.query(models.Subscriber).filter(
-        models.Subscriber.email == subscriber_data.email
+        models.Subscriber.email == email
     ).first()
     
     if existing_subscriber:
@@ -213,15 +252,18 @@ def subscribe_to_newsletter(
             # Reactivate subscription
             existing_subscriber.is_active = True
             existing_subscriber.unsubscribed_at = None
+            activity_feed.record_subscriber(db, existing_subscriber.id)
             db.commit()
             return {"message": "Subscription reactivated"}
     
     # Create new subscriber
     db_subscriber = models.Subscriber(
-        email=subscriber_data.email,
+        email=email,
         full_name=subscriber_data.full_name
     )
     db.add(db_subscriber)
+    db.flush()
+    activity_feed.record_subscriber(db, db_subscriber.id)
     db.commit()
     db.refresh(db_subscriber)
     
@@ -234,6 +276,11 @@ def unsubscribe_from_newsletter(
 ):
     """Unsubscribe from newsletter"""
     
+    try:
+        email = subscriber_io.normalize_email(email)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Subscriber not found")
+    
     subscriber = db.query(models.Subscriber).filter(
         models.Subscriber.email == email,
         models.Subscriber.is_active == True
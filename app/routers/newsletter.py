@@ -0,0 +1,85 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import os
+try:
+    from .. import models, schemas, newsletter
+    from ..database import get_db
+    from ..dependencies import get_admin_user
+except ImportError:
+    import models, schemas, newsletter
+    from database import get_db
+    from dependencies import get_admin_user
+
+router = APIRouter(prefix="/newsletter", tags=["Newsletter"])
+
+@router.post("/issues", response_model=schemas.NewsletterIssue)
+def create_issue(
+    issue: schemas.NewsletterIssueCreate,
+    current_user: schemas.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Create a newsletter issue, optionally announcing a published post"""
+    subject, body_text = issue.subject, issue.body_text
+    if issue.post_id is not None:
+        post = db.query(models.Post).filter(
+            models.Post.id == issue.post_id,
+            models.Post.is_published == True
+        ).first()
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found or not published")
+        post_url = f"{os.getenv('FRONTEND_URL', '').rstrip('/')}/posts/{post.slug}"
+        subject = subject or post.title
+        body_text = body_text or f"{post.title}\n\n{post.summary or ''}\n\nRead more: {post_url}\n"
+    if not subject or not body_text:
+        raise HTTPException(status_code=400, detail="subject and body_text are required without a post_id")
+
+    db_issue = models.NewsletterIssue(
+        subject=subject,
+        body_text=body_text,
+        body_html=issue.body_html,
+        post_id=issue.post_id,
+        created_by=current_user.id
+    )
+    db.add(db_issue)
+    db.commit()
+    db.refresh(db_issue)
+    return db_issue
+
+@router.get("/issues", response_model=List[schemas.NewsletterIssue])
+def get_issues(
+    limit: int = 20,
+    current_user: schemas.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Recent newsletter issues with their delivery progress"""
+    return db.query(models.NewsletterIssue).order_by(
+        models.NewsletterIssue.id.desc()
+    ).limit(limit).all()
+
+@router.get("/issues/{issue_id}", response_model=schemas.NewsletterIssue)
+def get_issue(
+    issue_id: int,
+    current_user: schemas.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    issue = db.get(models.NewsletterIssue, issue_id)
+    if not issue:
+        raise HTTPException(status_code=404, detail="Newsletter issue not found")
+    return issue
+
+@router.post("/issues/{issue_id}/send", status_code=202)
+def send_issue(
+    issue_id: int,
+    current_user: schemas.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Start (or resume) delivery in the background; poll the issue for progress"""
+    if not db.get(models.NewsletterIssue, issue_id):
+        raise HTTPException(status_code=404, detail="Newsletter issue not found")
+    try:
+        newsletter.claim(db, issue_id)
+    except newsletter.NewsletterBusy:
+        raise HTTPException(status_code=409, detail="Issue is already sent or being sent")
+    newsletter.dispatcher.start(issue_id)
+    return {"message": "Newsletter sending started", "issue_id": issue_id}
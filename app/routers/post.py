@@ -1,56 +1,219 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Callable, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 try:
-    from .. import models, schemas
-    from ..database import get_db
-    from ..dependencies import get_current_active_user
+    from .. import models, schemas, http_cache, search, activity_feed
+    from ..database import get_db, get_async_db
+    from ..query_stats import query_budget
+    from ..pagination import keyset_page_async, paginate
+    from ..dependencies import get_current_active_user, get_current_active_user_async
+    from ..cache import TTLCache
 except ImportError:
-    import models, schemas
-    from database import get_db
-    from dependencies import get_current_active_user
+    import models, schemas, http_cache, search, activity_feed
+    from database import get_db, get_async_db
+    from query_stats import query_budget
+    from pagination import keyset_page_async, paginate
+    from dependencies import get_current_active_user, get_current_active_user_async
+    from cache import TTLCache
+import os
 import re
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
+# slug -> post id for pretty URLs; entries are dropped when a post is renamed
+# or deleted here, and the TTL bounds staleness from other workers
+SLUG_CACHE_TTL_SECONDS = int(os.getenv("SLUG_CACHE_TTL_SECONDS", "300"))
+SLUG_CACHE_MAX_ENTRIES = int(os.getenv("SLUG_CACHE_MAX_ENTRIES", "10000"))
+# Saves that lose a race for the same slug regenerate it this many times
+SLUG_SAVE_ATTEMPTS = 3
+
+slug_cache = TTLCache(max_entries=SLUG_CACHE_MAX_ENTRIES, ttl=SLUG_CACHE_TTL_SECONDS)
+
 def create_slug(title: str) -> str:
-    return re.sub(r'[^a-zA-Z0-9]+', '-', title.lower()).strip('-')
+    return re.sub(r'[^a-zA-Z0-9]+', '-', title.lower()).strip('-') or "post"
+
+def unique_slug(db: Session, title: str, post_id: Optional[int] = None) -> str:
+    """Slug of ``title``, suffixed -2, -3, ... past the slugs other posts already use"""
+    base = create_slug(title)
+    query = db.query(models.Post.slug).filter(
+        or_(models.Post.slug == base, models.Post.slug.like(f"{base}-%"))
+    )
+    if post_id is not None:
+        query = query.filter(models.Post.id != post_id)
+    with db.no_autoflush:
+        taken = {slug for (slug,) in query}
+    
+    slug, suffix = base, 1
+    while slug in taken:
+        suffix += 1
+        slug = f"{base}-{suffix}"
+    return slug
+
+# Unique index behind Post.slug (unique=True, index=True)
+SLUG_UNIQUE_INDEX = "ix_posts_slug"
+
+def is_slug_conflict(exc: IntegrityError) -> bool:
+    """Whether ``exc`` is the slug uniqueness check, not some other constraint"""
+    diag = getattr(exc.orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint:
+        # PostgreSQL names the violated constraint
+        return constraint == SLUG_UNIQUE_INDEX
+    # SQLite: "UNIQUE constraint failed: posts.slug"; MySQL names the key
+    message = str(exc.orig)
+    return "posts.slug" in message or SLUG_UNIQUE_INDEX in message
+
+def save_with_unique_slug(
+    db: Session,
+    db_post: models.Post,
+    changes: dict,
+    on_save: Optional[Callable[[], None]] = None
+) -> None:
+    """Apply ``changes`` and commit, picking a fresh slug whenever the title is set.
 
-@router.get("/", response_model=List[schemas.Post])
-def get_posts(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    posts = db.query(models.Post).filter(models.Post.is_published == True).offset(skip).limit(limit).all()
-    return posts
+    ``on_save`` stages rows that belong in the same transaction; it runs
+    again on every attempt, since a rollback discards them.
+    """
+    for _ in range(SLUG_SAVE_ATTEMPTS):
+        for key, value in changes.items():
+            setattr(db_post, key, value)
+        if changes.get("title"):
+            db_post.slug = unique_slug(db, changes["title"], db_post.id)
+        db.add(db_post)
+        if on_save is not None:
+            on_save()
+        try:
+            db.commit()
+            return
+        except IntegrityError as exc:
+            db.rollback()
+            if not is_slug_conflict(exc):
+                raise
+            # Another request took the slug between the check and the commit
+    raise HTTPException(status_code=409, detail="Could not allocate a unique slug, please retry")
 
-@router.get("/my-posts", response_model=List[schemas.Post])
-def get_my_posts(
+@router.get("/", response_model=List[schemas.Post], dependencies=[Depends(query_budget(2))])
+async def get_posts(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    published = models.Post.is_published == True
+    fingerprint = (await db.execute(paginate(
+        http_cache.fingerprint(models.Post).where(published),
+        models.Post.created_at, models.Post.id, db.bind.dialect.name, cursor, skip, limit
+    ))).all()
+    not_modified = http_cache.conditional_response(
+        request, response, http_cache.compute_etag(fingerprint)
+    )
+    if not_modified:
+        return not_modified
+    
+    stmt = select(models.Post).options(joinedload(models.Post.author)).where(published)
+    return await keyset_page_async(
+        db, stmt, models.Post.created_at, models.Post.id, response,
+        cursor=cursor, skip=skip, limit=limit
+    )
+
+@router.get("/my-posts", response_model=List[schemas.Post], dependencies=[Depends(query_budget(2))])
+async def get_my_posts(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: schemas.User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user's posts (both published and drafts)"""
-    posts = db.query(models.Post).filter(
+    stmt = select(models.Post).options(joinedload(models.Post.author)).where(
         models.Post.author_id == current_user.id
-    ).order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
-    return posts
+    )
+    return await keyset_page_async(
+        db, stmt, models.Post.created_at, models.Post.id, response,
+        cursor=cursor, skip=skip, limit=limit
+    )
+
+@router.get("/search", response_model=List[schemas.PostSearchResult], dependencies=[Depends(query_budget(1))])
+async def search_posts(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search of published posts, best matches first"""
+    return await search.search_posts(db, q, response, cursor=cursor, limit=limit)
+
+async def _post_fingerprint(db: AsyncSession, *criteria):
+    return (await db.execute(http_cache.fingerprint(models.Post).where(*criteria))).first()
 
-@router.get("/{post_id}", response_model=schemas.Post)
-def get_post(post_id: int, db: Session = Depends(get_db)):
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
+async def _read_post(db: AsyncSession, request: Request, response: Response, fingerprint):
+    """Full post for a fingerprint row, or a 304 if the client's copy is current"""
+    not_modified = http_cache.conditional_response(
+        request, response, http_cache.compute_etag([fingerprint]), http_cache.last_modified(fingerprint)
+    )
+    if not_modified:
+        return not_modified
+    
+    post = (await db.execute(
+        select(models.Post).options(joinedload(models.Post.author)).where(models.Post.id == fingerprint.id)
+    )).scalars().first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     return post
 
+@router.get("/by-slug/{slug}", response_model=schemas.Post, dependencies=[Depends(query_budget(3))])
+async def get_post_by_slug(
+    slug: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a post by its slug; known slugs are read by primary key"""
+    fingerprint = None
+    post_id = slug_cache.get(slug)
+    if post_id is not None:
+        fingerprint = await _post_fingerprint(db, models.Post.id == post_id, models.Post.slug == slug)
+    if fingerprint is None:
+        # Not cached yet, or renamed or deleted by another worker since
+        fingerprint = await _post_fingerprint(db, models.Post.slug == slug)
+        if not fingerprint:
+            slug_cache.pop(slug)
+            raise HTTPException(status_code=404, detail="Post not found")
+        slug_cache.set(slug, fingerprint.id)
+    return await _read_post(db, request, response, fingerprint)
+
+@router.get("/{post_id}", response_model=schemas.Post, dependencies=[Depends(query_budget(2))])
+async def get_post(
+    post_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
+    fingerprint = await _post_fingerprint(db, models.Post.id == post_id)
+    if not fingerprint:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return await _read_post(db, request, response, fingerprint)
+
 @router.post("/", response_model=schemas.Post)
 def create_post(
     post: schemas.PostCreate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_active_user)
 ):
-    slug = create_slug(post.title)
-    db_post = models.Post(**post.dict(), author_id=current_user.id, slug=slug)
-    db.add(db_post)
-    db.commit()
+    db_post = models.Post(author_id=current_user.id)
+    
+    def record_activity():
+        activity_type = activity_feed.POST_CREATED if db_post.is_published else activity_feed.DRAFT_CREATED
+        activity_feed.record(db, current_user.id, activity_type, post=db_post)
+    
+    save_with_unique_slug(db, db_post, post.dict(), on_save=record_activity)
     db.refresh(db_post)
     return db_post
 
@@ -61,20 +224,25 @@ def update_post(
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_active_user)
 ):
-    db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
+    db_post = db.query(models.Post).options(joinedload(models.Post.author)).filter(
+        models.Post.id == post_id
+    ).first()
     if not db_post:
         raise HTTPException(status_code=404, detail="Post not found")
     
     if db_post.author_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    for key, value in post_update.dict(exclude_unset=True).items():
-        if key == "title" and value:
-            setattr(db_post, "slug", create_slug(value))
-        setattr(db_post, key, value)
+    old_slug = db_post.slug
+    was_published = db_post.is_published
     
-    db.commit()
+    def record_activity():
+        if db_post.is_published and not was_published:
+            activity_feed.record(db, db_post.author_id, activity_feed.POST_PUBLISHED, post=db_post)
+    
+    save_with_unique_slug(db, db_post, post_update.dict(exclude_unset=True), on_save=record_activity)
     db.refresh(db_post)
+    slug_cache.pop(old_slug)
     return db_post
 
 @router.delete("/{post_id}")
@@ -90,6 +258,9 @@ def delete_post(
     if db_post.author_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
+    slug = db_post.slug
+    activity_feed.forget(db, post_id=post_id)
     db.delete(db_post)
     db.commit()
+    slug_cache.pop(slug)
     return {"message": "Post deleted successfully"}
\ No newline at end of file
@@ -1,31 +1,39 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from datetime import date
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 try:
-    from .. import models, schemas
+    from .. import models, schemas, subscriber_io
     from ..database import get_db
-    from ..dependencies import get_current_active_user
+    from ..query_stats import query_budget
+    from ..pagination import keyset_page
+    from ..dependencies import get_current_active_user, get_admin_user
 except ImportError:
-    import models, schemas
+    import models, schemas, subscriber_io
     from database import get_db
-    from dependencies import get_current_active_user
+    from query_stats import query_budget
+    from pagination import keyset_page
+    from dependencies import get_current_active_user, get_admin_user
 
 router = APIRouter(prefix="/subscribers", tags=["Subscribers"])
 
-@router.get("/", response_model=List[schemas.SubscriberResponse])
+@router.get("/", response_model=List[schemas.SubscriberResponse], dependencies=[Depends(query_budget(2))])
 def get_subscribers(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: schemas.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Get all subscribers (admin only for now)"""
     
-    subscribers = db.query(models.Subscriber).filter(
-        models.Subscriber.is_active == True
-    ).offset(skip).limit(limit).all()
-    
-    return subscribers
+    query = db.query(models.Subscriber).filter(models.Subscriber.is_active == True)
+    return keyset_page(
+        query, models.Subscriber.subscribed_at, models.Subscriber.id, response,
+        cursor=cursor, skip=skip, limit=limit
+    )
 
 @router.get("/stats")
 def get_subscriber_stats(
@@ -46,4 +54,29 @@ def get_subscriber_stats(
         "total_active": total_subscribers,
         "total_unsubscribed": total_unsubscribed,
         "total_all_time": total_subscribers + total_unsubscribed
-    }
\ No newline at end of file
+    }
+
+@router.post("/import")
+def import_subscribers(
+    file: UploadFile = File(...),
+    current_user: schemas.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk import subscribers from a CSV with an email column (and optionally full_name)"""
+    try:
+        return subscriber_io.import_csv(db, file.file)
+    except subscriber_io.ImportFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@router.get("/export")
+def export_subscribers(
+    include_unsubscribed: bool = False,
+    current_user: schemas.User = Depends(get_admin_user)
+):
+    """Stream subscribers as CSV"""
+    filename = f"subscribers-{date.today().isoformat()}.csv"
+    return StreamingResponse(
+        subscriber_io.export_csv(include_unsubscribed),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
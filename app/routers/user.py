@@ -1,14 +1,17 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 try:
-    from .. import models, schemas, auth
-    from ..database import get_db
-    from ..dependencies import get_current_active_user
+    from .. import models, schemas, auth, refresh_tokens, data_export
+    from ..database import get_db, get_async_db
+    from ..dependencies import get_current_active_user, get_current_active_user_async, invalidate_user
 except ImportError:
-    import models, schemas, auth
-    from database import get_db
-    from dependencies import get_current_active_user
+    import models, schemas, auth, refresh_tokens, data_export
+    from database import get_db, get_async_db
+    from dependencies import get_current_active_user, get_current_active_user_async, invalidate_user
 
 router = APIRouter(prefix="/user", tags=["User Management"])
 
@@ -51,32 +54,40 @@ def update_user_profile(
             )
     
     # Update user fields
+    previous_username = current_user.username
     for field, value in profile_update.dict(exclude_unset=True).items():
         if hasattr(current_user, field):
             setattr(current_user, field, value)
     
     db.commit()
     db.refresh(current_user)
+    invalidate_user(previous_username, current_user.username)
     return current_user
 
 @router.put("/change-password")
-def change_password(
+async def change_password(
     password_change: schemas.PasswordChange,
-    current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: schemas.User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Change user's password"""
     
     # Verify current password
-    if not auth.verify_password(password_change.current_password, current_user.hashed_password):
+    verified, _ = await auth.verify_password_async(
+        password_change.current_password, current_user.hashed_password
+    )
+    if not verified:
         raise HTTPException(
             status_code=400,
             detail="Current password is incorrect"
         )
     
     # Update password
-    current_user.hashed_password = auth.get_password_hash(password_change.new_password)
-    db.commit()
+    current_user.hashed_password = await auth.get_password_hash_async(password_change.new_password)
+    # Sessions elsewhere must sign in again with the new password
+    await db.execute(refresh_tokens.revoke_for_user(current_user.id))
+    await db.commit()
+    invalidate_user(current_user.username)
     
     return {"message": "Password updated successfully"}
 
@@ -142,58 +153,28 @@ def delete_account(
     """Delete user account (soft delete)"""
     
     # Soft delete - just deactivate the account
+    username = current_user.username
     current_user.is_active = False
+    db.execute(refresh_tokens.revoke_for_user(current_user.id))
     db.commit()
+    invalidate_user(username)
+    auth.revoke_user_tokens(username)
     
     return {"message": "Account deactivated successfully"}
 
 @router.get("/export-data")
 def export_user_data(
-    current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    format: str = Query("ndjson", pattern="^(ndjson|zip)$"),
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
-    """Export user's data"""
-    
-    # Get user's posts
-    posts = db.query(models.Post).filter(
-        models.Post.author_id == current_user.id
-    ).all()
-    
-    # Get user's comments
-    comments = db.query(models.Comment).filter(
-        models.Comment.author_id == current_user.id
-    ).all()
-    
-    export_data = {
-        "user": {
-            "id": current_user.id,
-            "username": current_user.username,
-            "email": current_user.email,
-            "full_name": current_user.full_name,
-            "created_at": current_user.created_at.isoformat()
-        },
-        "posts": [
-            {
-                "id": post.id,
-                "title": post.title,
-                "content": post.content,
-                "summary": post.summary,
-                "slug": post.slug,
-                "is_published": post.is_published,
-                "created_at": post.created_at.isoformat(),
-                "updated_at": post.updated_at.isoformat() if post.updated_at else None
-            }
-            for post in posts
-        ],
-        "comments": [
-            {
-                "id": comment.id,
-                "content": comment.content,
-                "created_at": comment.created_at.isoformat(),
-                "post_title": comment.post.title
-            }
-            for comment in comments
-        ]
-    }
-    
-    return export_data
\ No newline at end of file
+    """Export user's data, streamed as NDJSON or as a ZIP of NDJSON files"""
+    filename = f"{current_user.username}-export-{date.today().isoformat()}"
+    if format == "zip":
+        body, media_type, filename = data_export.zip_chunks(current_user.id), "application/zip", f"{filename}.zip"
+    else:
+        body, media_type, filename = data_export.ndjson_chunks(current_user.id), "application/x-ndjson", f"{filename}.ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
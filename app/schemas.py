@@ -116,6 +116,15 @@ class Post(PostBase):
     class Config:
         from_attributes = True
 
+class PostSearchResult(BaseModel):
+    id: int
+    title: str
+    slug: str
+    summary: Optional[str] = None
+    snippet: str
+    created_at: datetime
+    author: User
+
 # Comment Schemas
 class CommentBase(BaseModel):
     content: str
@@ -170,6 +179,30 @@ class SubscriberResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class NewsletterIssueCreate(BaseModel):
+    subject: Optional[str] = None
+    body_text: Optional[str] = None
+    body_html: Optional[str] = None
+    post_id: Optional[int] = None
+
+class NewsletterIssue(BaseModel):
+    id: int
+    subject: str
+    body_text: str
+    body_html: Optional[str] = None
+    post_id: Optional[int] = None
+    status: str
+    last_subscriber_id: int
+    sent_count: int
+    failed_count: int
+    messages_per_second: float
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
 class AnalyticsOverview(BaseModel):
     total_posts: int
     published_posts: int
@@ -206,6 +239,10 @@ class AudienceGrowth(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: Optional[str] = None
\ No newline at end of file
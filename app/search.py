@@ -0,0 +1,250 @@
+"""
+Full-text search over published posts.
+
+On SQLite the index is ``posts_fts``, an FTS5 external-content table over
+the title, summary and content of ``posts``. Triggers keep it in step with
+every insert, delete and edit of those columns, so the post write paths
+need no changes, and counter updates do not touch it. On Postgres the same
+interface is backed by a stored, generated ``tsvector`` column with a GIN
+index.
+
+Results are ranked best first (BM25 on SQLite, ``ts_rank_cd`` on Postgres)
+and carry a highlighted snippet: the post text is HTML-escaped, so the
+``<mark>`` tags around matches are its only markup. They are paged by an
+opaque ``(score, id)`` cursor in the ``X-Next-Cursor`` header, like the
+other lists; scores depend on the whole corpus, so posts written between
+two page loads can shift the ranking slightly.
+
+The index is created at startup, and filled from existing posts the first
+time. To re-index everything:
+
+    python -m app.search rebuild
+"""
+import html
+import re
+import sys
+from typing import Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import column, func, literal_column, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, joinedload
+
+try:
+    from . import models
+    from .database import engine
+    from .pagination import NEXT_CURSOR_HEADER, decode_key, encode_key
+except ImportError:
+    import models
+    from database import engine
+    from pagination import NEXT_CURSOR_HEADER, decode_key, encode_key
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Private-use characters the database wraps around matches. Snippets are
+# post text, so they are HTML-escaped first and only then get real tags.
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+SNIPPET_WORDS = 24
+
+
+def highlight(snippet: Optional[str]) -> Optional[str]:
+    """Escape a raw snippet and turn the match markers into highlight tags"""
+    if snippet is None:
+        return None
+    return (
+        html.escape(snippet)
+        .replace(MATCH_START, HIGHLIGHT_START)
+        .replace(MATCH_END, HIGHLIGHT_END)
+    )
+
+
+def terms(query: str) -> list:
+    """Words of a free-text query; punctuation and operators are dropped"""
+    return re.findall(r"\w+", query.lower())
+
+
+class SqliteSearch:
+    """FTS5 external-content index kept in sync by triggers"""
+
+    fts = table("posts_fts", column("rowid"))
+
+    ddl = [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            title, summary, content,
+            content='posts', content_rowid='id', tokenize='porter unicode61'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts(rowid, title, summary, content)
+            VALUES (new.id, new.title, new.summary, new.content);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+            INSERT INTO posts_fts(posts_fts, rowid, title, summary, content)
+            VALUES ('delete', old.id, old.title, old.summary, old.content);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, summary, content ON posts BEGIN
+            INSERT INTO posts_fts(posts_fts, rowid, title, summary, content)
+            VALUES ('delete', old.id, old.title, old.summary, old.content);
+            INSERT INTO posts_fts(rowid, title, summary, content)
+            VALUES (new.id, new.title, new.summary, new.content);
+        END
+        """,
+    ]
+
+    def create(self, connection) -> None:
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+        ).first()
+        for statement in self.ddl:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            self.rebuild(connection)
+
+    def rebuild(self, connection) -> None:
+        connection.exec_driver_sql("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+
+    def statement(self, words: list):
+        """select() of (Post, score, snippet) for the matches; higher scores rank first"""
+        # Every word must match; the last one may still be being typed
+        match = " ".join(f'"{word}"' for word in words) + "*"
+        fts = literal_column("posts_fts")
+        # Title hits weigh most, then summary, then body
+        score = -func.bm25(fts, 10.0, 5.0, 1.0)
+        snippet = func.snippet(fts, -1, MATCH_START, MATCH_END, "…", SNIPPET_WORDS)
+        return (
+            select(models.Post, score.label("score"), snippet.label("snippet"))
+            .join(self.fts, self.fts.c.rowid == models.Post.id)
+            .where(fts.op("MATCH")(match))
+        ), score
+
+
+class PostgresSearch:
+    """Generated, weighted ``tsvector`` column with a GIN index"""
+
+    ddl = [
+        """
+        ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(summary, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(content, '')), 'C')
+        ) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING GIN (search_vector)",
+    ]
+
+    def create(self, connection) -> None:
+        for statement in self.ddl:
+            connection.exec_driver_sql(statement)
+
+    def rebuild(self, connection) -> None:
+        # The column is recomputed on every write; only the index can drift
+        connection.exec_driver_sql("REINDEX INDEX ix_posts_search_vector")
+
+    def statement(self, words: list):
+        """select() of (Post, score, snippet) for the matches; higher scores rank first"""
+        config = literal_column("'english'::regconfig")
+        query = func.websearch_to_tsquery(config, " ".join(words))
+        vector = literal_column("posts.search_vector")
+        score = func.ts_rank_cd(vector, query)
+        snippet = func.ts_headline(
+            config,
+            func.concat_ws(" ", models.Post.summary, models.Post.content),
+            query,
+            f'StartSel="{MATCH_START}", StopSel="{MATCH_END}", '
+            f"MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}",
+        )
+        return (
+            select(models.Post, score.label("score"), snippet.label("snippet"))
+            .where(vector.op("@@")(query))
+        ), score
+
+
+BACKENDS = {"sqlite": SqliteSearch(), "postgresql": PostgresSearch()}
+
+
+def backend_for(dialect_name: str):
+    backend = BACKENDS.get(dialect_name)
+    if backend is None:
+        raise HTTPException(status_code=501, detail=f"Search is not available on {dialect_name}")
+    return backend
+
+
+def ensure_index(bind=engine) -> None:
+    """Create the search index if missing; called at startup"""
+    backend = BACKENDS.get(bind.dialect.name)
+    if backend is not None:
+        with bind.begin() as connection:
+            backend.create(connection)
+
+
+def rebuild_index(bind=engine) -> None:
+    backend = backend_for(bind.dialect.name)
+    with bind.begin() as connection:
+        backend.create(connection)
+        backend.rebuild(connection)
+
+
+async def search_posts(
+    db: AsyncSession,
+    query: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+) -> list:
+    """One page of published posts matching ``query``, best first"""
+    words = terms(query)
+    if not words:
+        return []
+
+    statement, score = backend_for(db.bind.dialect.name).statement(words)
+    statement = statement.options(
+        joinedload(models.Post.author), defer(models.Post.content)
+    ).where(models.Post.is_published == True)
+    if cursor:
+        try:
+            last_score, last_id = decode_key(cursor)
+            bound = (float(last_score), int(last_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        statement = statement.where(tuple_(score, models.Post.id) < tuple_(*bound))
+    statement = statement.order_by(score.desc(), models.Post.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(statement)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_key(rows[-1][1], rows[-1][0].id)
+    return [
+        {
+            "id": post.id,
+            "title": post.title,
+            "slug": post.slug,
+            "summary": post.summary,
+            "snippet": highlight(snippet),
+            "created_at": post.created_at,
+            "author": post.author,
+        }
+        for post, _, snippet in rows
+    ]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["rebuild"]:
+        print("Usage: python -m app.search rebuild")
+        return 1
+
+    rebuild_index()
+    print(f"Rebuilt the post search index ({engine.dialect.name})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
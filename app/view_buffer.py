@@ -0,0 +1,167 @@
+"""
+Write-behind buffer for post view events.
+
+``/interactions/view`` only enqueues the event; a background thread inserts
+queued views in bulk (one executemany per batch) once ``batch_size`` events
+are waiting or the oldest one is ``flush_interval`` seconds old. The queue
+is bounded: when it is full new events are dropped and counted rather than
+blocking the request. Stopping the buffer drains whatever is still queued.
+Each flush also bumps ``posts.view_count`` in the same transaction.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+try:
+    from . import models, counters
+    from .database import engine
+except ImportError:
+    import models, counters
+    from database import engine
+
+logger = logging.getLogger(__name__)
+
+VIEW_BUFFER_MAX_SIZE = int(os.getenv("VIEW_BUFFER_MAX_SIZE", "10000"))
+VIEW_BUFFER_BATCH_SIZE = int(os.getenv("VIEW_BUFFER_BATCH_SIZE", "500"))
+VIEW_BUFFER_FLUSH_INTERVAL = float(os.getenv("VIEW_BUFFER_FLUSH_INTERVAL", "1.0"))
+
+
+class ViewBuffer:
+    """Bounded in-process queue of view rows flushed in batches"""
+
+    def __init__(
+        self,
+        bind=engine,
+        max_size: int = VIEW_BUFFER_MAX_SIZE,
+        batch_size: int = VIEW_BUFFER_BATCH_SIZE,
+        flush_interval: float = VIEW_BUFFER_FLUSH_INTERVAL,
+    ):
+        self.bind = bind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "dropped": 0,
+            "flushed": 0,
+            "failed": 0,
+            "flushes": 0,
+        }
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_last = 0.0
+        self._flush_seconds_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="view-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher and write out everything still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._drain()
+
+    def submit(self, view: Dict) -> bool:
+        """Queue a view row; returns False if it was dropped because the queue is full"""
+        try:
+            self._queue.put_nowait(view)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def write(self, views: List[Dict]) -> None:
+        """Insert view rows immediately, bypassing the queue"""
+        self._flush(views)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            flushes = self._counters["flushes"]
+            return {
+                "running": self.running,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                **self._counters,
+                "flush_ms_last": round(self._flush_seconds_last * 1000, 2),
+                "flush_ms_max": round(self._flush_seconds_max * 1000, 2),
+                "flush_ms_avg": round(self._flush_seconds_total * 1000 / flushes, 2) if flushes else 0.0,
+            }
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._counters[counter] += amount
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+
+    def _collect_batch(self) -> List[Dict]:
+        """Block for the first event, then gather until the batch is full or old enough"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self) -> None:
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._flush(batch)
+
+    def _flush(self, batch: List[Dict]) -> None:
+        started = time.perf_counter()
+        try:
+            with self.bind.begin() as connection:
+                connection.execute(insert(models.PostView.__table__), batch)
+                counters.add_views(connection, Counter(view["post_id"] for view in batch))
+        except Exception:
+            logger.exception("Failed to flush %d buffered post views", len(batch))
+            self._count("failed", len(batch))
+            return
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._counters["flushed"] += len(batch)
+            self._counters["flushes"] += 1
+            self._flush_seconds_total += elapsed
+            self._flush_seconds_last = elapsed
+            self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+
+
+view_buffer = ViewBuffer()
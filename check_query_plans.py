@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the API's database access.
+
+Exercises the routers against a scratch SQLite database, captures every
+statement they send, runs EXPLAIN QUERY PLAN on each one and fails if any
+of them scans a whole interaction table instead of searching an index.
+
+Usage:
+    python check_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+INTERACTION_TABLES = {"post_views", "post_likes", "post_shares", "comments", "post_daily_stats", "activities"}
+
+# "SCAN post_views", "SCAN post_views USING INDEX ...", "SCAN p AS post_views_1"...
+SCAN_PATTERN = re.compile(r"^SCAN (\w+)")
+
+
+def scanned_table(detail, aliases):
+    match = SCAN_PATTERN.match(detail)
+    if not match:
+        return None
+    name = match.group(1)
+    return aliases.get(name, re.sub(r"_\d+$", "", name))
+
+
+def table_aliases(statement):
+    """Map SQL aliases back to table names ("post_views AS post_views_1")"""
+    return {
+        alias: table
+        for table, alias in re.findall(r"\b(\w+) AS (\w+)\b", statement)
+    }
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="query-plans-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/plans.db"
+    os.environ["ROLLUP_INTERVAL_SECONDS"] = "0"
+    # Surface N+1 lazy loads as errors while exercising the routes
+    os.environ["DB_RAISE_ON_LAZY_LOAD"] = "true"
+    # ...and routes going over their declared query budgets
+    os.environ["QUERY_BUDGET_ENFORCE"] = "true"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from app.main import app
+    from app.database import engine, async_engine, SessionLocal
+    from app import rollup
+
+    captured = []
+    state = {"label": None}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        sql = statement.lstrip().upper()
+        reads = sql.startswith(("SELECT", "UPDATE", "DELETE", "WITH")) or (
+            sql.startswith("INSERT") and "SELECT" in sql
+        )
+        if state["label"] and reads:
+            if executemany:
+                parameters = parameters[0] if parameters else ()
+            captured.append((state["label"], statement, parameters))
+
+    # Async routes run on their own engine; capture both
+    for watched in (engine, async_engine.sync_engine):
+        event.listen(watched, "before_cursor_execute", capture)
+
+    with TestClient(app) as client:
+        # Seed a little of everything so every code path runs
+        client.post("/auth/register", json={"username": "author", "email": "author@example.com", "password": "secret"})
+        client.post("/auth/register", json={"username": "reader", "email": "reader@example.com", "password": "secret"})
+        author = {"Authorization": "Bearer " + client.post(
+            "/auth/login", data={"username": "author", "password": "secret"}
+        ).json()["access_token"]}
+        reader = {"Authorization": "Bearer " + client.post(
+            "/auth/login", data={"username": "reader", "password": "secret"}
+        ).json()["access_token"]}
+
+        post_ids = []
+        for index in range(3):
+            response = client.post("/posts/", headers=author, json={
+                "title": f"Query plan post {index}",
+                "content": "Body text",
+                "summary": "Summary",
+                "is_published": True,
+            })
+            post_ids.append(response.json()["id"])
+        post_id = post_ids[0]
+        client.post("/interactions/subscribe", json={"email": "subscriber@example.com"})
+
+        requests = [
+            ("POST", "/comments/", reader, {"post_id": post_id, "content": "Nice post"}),
+            ("PUT", f"/posts/{post_id}", author, {"summary": "Updated summary"}),
+            ("POST", "/interactions/view", reader, {"post_id": post_id}),
+            ("POST", "/interactions/like", reader, {"post_id": post_id}),
+            ("POST", "/interactions/share", reader, {"post_id": post_id, "platform": "twitter"}),
+            ("POST", "/interactions/subscribe", None, {"email": "fan-out@example.com"}),
+            ("GET", "/posts/", None, None),
+            ("GET", "/posts/my-posts", author, None),
+            ("GET", f"/posts/{post_id}", None, None),
+            ("GET", "/posts/by-slug/query-plan-post-1", None, None),
+            ("GET", "/posts/search?q=query+plan&limit=1", None, None),
+            ("GET", f"/comments/post/{post_id}", None, None),
+            ("GET", "/comments/my-comments", reader, None),
+            ("GET", f"/interactions/post/{post_id}/stats", None, None),
+            ("GET", f"/interactions/post/{post_id}/user-interactions", reader, None),
+            ("GET", "/dashboard/stats", author, None),
+            ("GET", "/dashboard/recent-posts", author, None),
+            ("GET", "/dashboard/recent-comments", author, None),
+            ("GET", "/dashboard/activity-feed", author, None),
+            ("GET", "/dashboard/summary", author, None),
+            ("GET", "/analytics/overview", author, None),
+            ("GET", "/analytics/top-posts?sort_by=engagement", author, None),
+            ("GET", "/analytics/views-over-time?granularity=week", author, None),
+            ("GET", "/analytics/views-over-time?granularity=hour", author, None),
+            ("GET", "/analytics/audience-growth", author, None),
+            ("GET", "/subscribers/", author, None),
+            ("GET", "/user/export-data", author, None),
+            ("POST", "/interactions/like", reader, {"post_id": post_id}),
+            ("DELETE", f"/posts/{post_ids[-1]}", author, None),
+        ]
+        for method, path, headers, body in requests:
+            state["label"] = f"{method} {path}"
+            response = client.request(method, path, headers=headers, json=body)
+            if response.status_code >= 400:
+                print(f"⚠️  {method} {path} returned {response.status_code}")
+            state["label"] = None
+
+        # A deeper activity feed page, continued from the first page's cursor
+        first_page = client.get("/dashboard/activity-feed?limit=2", headers=author)
+        state["label"] = "GET /dashboard/activity-feed (cursor)"
+        client.get(
+            "/dashboard/activity-feed",
+            params={"limit": 2, "cursor": first_page.headers.get("X-Next-Cursor")},
+            headers=author,
+        )
+        state["label"] = None
+
+        # Second pass over the analytics paths, served from a fresh rollup
+        db = SessionLocal()
+        try:
+            state["label"] = "rollup job"
+            rollup.run_rollup(db)
+            rollup.run_rollup(db)
+        finally:
+            state["label"] = None
+            db.close()
+        for path in ["/analytics/overview", "/analytics/top-posts", "/analytics/views-over-time", "/dashboard/stats"]:
+            state["label"] = f"GET {path} (rollup)"
+            client.get(path, headers=author)
+            state["label"] = None
+
+    failures = []
+    checked = set()
+    with engine.connect() as conn:
+        for label, statement, parameters in captured:
+            if (label, statement) in checked:
+                continue
+            checked.add((label, statement))
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            aliases = table_aliases(statement)
+            scans = {
+                scanned_table(row[-1], aliases)
+                for row in plan
+            } & INTERACTION_TABLES
+            if scans:
+                failures.append((label, statement, plan, scans))
+
+    print(f"Checked {len(checked)} statements")
+    for label, statement, plan, scans in failures:
+        print(f"\n❌ {label}: full scan of {', '.join(sorted(scans))}")
+        print("   " + " ".join(statement.split()))
+        for row in plan:
+            print(f"   | {row[-1]}")
+
+    if failures:
+        print(f"\n{len(failures)} statement(s) scan an interaction table")
+        return False
+    print("✅ No full scans of interaction tables")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
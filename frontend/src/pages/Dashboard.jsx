@@ -39,14 +39,11 @@ function Dashboard() {
       setLoading(true);
       setError('');
 
-      // Fetch dashboard stats and recent posts in parallel
-      const [statsResponse, postsResponse] = await Promise.all([
-        apiService.getDashboardStats(),
-        apiService.getRecentPosts(5)
-      ]);
+      // Stats and recent posts in a single request
+      const summary = await apiService.getDashboardSummary(5);
 
-      setStats(statsResponse);
-      setRecentPosts(postsResponse.recentPosts || []);
+      setStats(summary.stats);
+      setRecentPosts(summary.recentPosts || []);
       
     } catch (err) {
       console.error('Failed to fetch dashboard data:', err);
@@ -117,6 +117,14 @@ class ApiService {
   }
 
   // Dashboard endpoints
+  async getDashboardSummary(limit = 5, activityLimit = 10) {
+    const response = await fetch(`${this.baseURL}/dashboard/summary?limit=${limit}&activity_limit=${activityLimit}`, {
+      headers: this.getHeaders(),
+    });
+
+    return this.handleResponse(response);
+  }
+
   async getDashboardStats() {
     const response = await fetch(`${this.baseURL}/dashboard/stats`, {
       headers: this.getHeaders(),
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Concurrent HTTP load test for the API, standard library only.
+
+Opens ``--connections`` keep-alive connections, each sending GET requests
+back to back for ``--duration`` seconds, and reports throughput, latency
+percentiles and status codes. Start the API with a single worker first:
+
+    uvicorn app.main:app --workers 1 --port 8000
+
+Usage:
+    python load_test.py http://127.0.0.1:8000/posts/ --connections 500 --duration 15
+    python load_test.py http://127.0.0.1:8000/analytics/overview -H "Authorization: Bearer <token>"
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; returns (status, keep_alive)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+
+    length, chunked, keep_alive = 0, False, True
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value:
+            chunked = True
+        elif name == "connection" and value == "close":
+            keep_alive = False
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def worker(url, headers, deadline, results):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+    request = (
+        f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        + "".join(f"{header}\r\n" for header in headers)
+        + "\r\n"
+    ).encode()
+
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    host, port, ssl=parts.scheme == "https" or None
+                )
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            results.latencies.append(time.perf_counter() - started)
+            results.statuses[status] += 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as exc:
+            results.errors[type(exc).__name__] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def run(args):
+    results = Results()
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+    await asyncio.gather(*[
+        worker(args.url, args.header, deadline, results)
+        for _ in range(args.connections)
+    ])
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(results.latencies)
+    total = len(latencies)
+    print(f"{args.url} with {args.connections} connections for {elapsed:.1f}s")
+    print(f"  requests:   {total} ({total / elapsed:.1f} req/s)")
+    if total:
+        print(
+            "  latency ms: "
+            f"p50 {percentile(latencies, 0.50) * 1000:.1f}  "
+            f"p90 {percentile(latencies, 0.90) * 1000:.1f}  "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f}  "
+            f"max {latencies[-1] * 1000:.1f}"
+        )
+    print("  statuses:   " + (", ".join(f"{code}: {count}" for code, count in sorted(results.statuses.items())) or "none"))
+    if results.errors:
+        print("  errors:     " + ", ".join(f"{name}: {count}" for name, count in results.errors.items()))
+    return not results.errors and all(200 <= code < 400 for code in results.statuses)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url")
+    parser.add_argument("-c", "--connections", type=int, default=500)
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("-H", "--header", action="append", default=[], help='extra header, e.g. "Authorization: Bearer ..."')
+    args = parser.parse_args(argv)
+    return 0 if asyncio.run(run(args)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())